@@ -5,56 +5,96 @@ import os
 import json
 import uuid
 import time
+import shutil
 import threading
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from pathlib import Path, PurePath
 
-import cv2
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session, send_from_directory
+from flask import (
+    Flask, Response, render_template, request, jsonify, flash, redirect, url_for, session,
+    send_from_directory, stream_with_context
+)
+from werkzeug.http import parse_content_range_header
 
 from config import (
     logger, FACE_TOLERANCE, SCREENSHOTS_DIR, MIN_DETECTION_INTERVAL, 
     TEMP_DIR, MAX_UPLOAD_SIZE, MAX_PROCESSING_THREADS, FRAME_SCALE,
-    FACE_DETECTION_MODEL
+    FACE_DETECTION_MODEL, PREVIEW_DIR, PREVIEW_INTERVAL, TASK_CACHE_SIZE, TASK_TTL,
+    MAX_CONCURRENT_TASKS, UPLOADS_DIR, PROGRESS_STREAM_INTERVAL, CHUNK_UPLOAD_TTL, OPENCV_NUM_THREADS
 )
+# config会设置OMP_NUM_THREADS，cv2必须在其之后导入
+import cv2
 from modules.face_detector import FaceDetector
 from modules.video_processor import VideoProcessor
+from modules.task_store import TaskStore, ProgressNotifier
+from modules.lazy_frame import as_array
 from modules.utils import save_image, clean_old_files, clean_all_temp_directories
 
+# 检测线程各自调用cv2，关闭OpenCV内部的线程池，避免与处理线程数相乘。
+# 这是进程级设置，只在程序入口设置一次，导入各功能模块本身不会修改它
+cv2.setNumThreads(OPENCV_NUM_THREADS)
+
 # 初始化Flask应用
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE  # 使用配置中的上传文件大小限制
-app.config['UPLOAD_FOLDER'] = 'output/uploads'
-app.config['TEMP_FOLDER'] = 'output/temp'
+app.config['UPLOAD_FOLDER'] = str(UPLOADS_DIR)
+app.config['TEMP_FOLDER'] = str(PREVIEW_DIR)  # 预览图像目录，Linux下默认位于内存文件系统
 
 # 确保目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['TEMP_FOLDER'], exist_ok=True)
 
-# 存储当前任务信息
-tasks = {}
+def release_task(task_id, task):
+    """任务过期时释放其占用的资源，并删除该任务的截图和预览图像"""
+    processor = task.get('processor')
+    paths = [task.get('preview_image')]
+    if processor:
+        processor.close_video()
+        paths.extend(result['screenshot_path'] for result in processor.get_detection_results())
+    
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+# 存储当前任务信息，超过容量或长时间未访问的已完成任务会被自动清理
+tasks = TaskStore(maxsize=TASK_CACHE_SIZE, ttl=TASK_TTL, on_evict=release_task)
+
+# 视频处理任务线程池，超出并发数的任务排队等待，避免多个任务争抢CPU/GPU
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TASKS, thread_name_prefix='video_task')
+
+# 分块上传中的视频文件信息，长时间未收到分块的上传会被清理
+chunk_uploads = {}
+# 保证同一个上传任务的分块校验和领取是原子的，不在持有期间读取请求体
+chunk_uploads_lock = threading.Lock()
+
+# 写入上传文件时每次复制的字节数
+UPLOAD_COPY_BUFFER_SIZE = 4 * 1024 * 1024
 
 # 应用启动时执行一次清理
 clean_all_temp_directories()
 
 # 允许的文件类型
 ALLOWED_EXTENSIONS = {
-    'image': {'png', 'jpg', 'jpeg'},
-    'video': {'mp4', 'avi', 'mov', 'mkv'}
+    'image': frozenset({'png', 'jpg', 'jpeg'}),
+    'video': frozenset({'mp4', 'avi', 'mov', 'mkv'})
 }
 
+def get_extension(filename):
+    """获取小写的文件扩展名（不含点），没有扩展名时返回空字符串"""
+    return PurePath(filename).suffix[1:].lower()
+
 def allowed_file(filename, file_type):
     """检查文件扩展名是否允许"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS.get(file_type, set())
+    return get_extension(filename) in ALLOWED_EXTENSIONS.get(file_type, frozenset())
 
 def get_file_path(file, folder, prefix=''):
     """处理上传的文件并返回保存路径"""
     if file and file.filename:
         # 生成安全的文件名
-        original_filename = file.filename
-        extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+        extension = get_extension(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         unique_id = str(uuid.uuid4())[:8]
         
@@ -64,10 +104,32 @@ def get_file_path(file, folder, prefix=''):
             filename = f"{timestamp}_{unique_id}.{extension}"
             
         filepath = os.path.join(folder, filename)
-        file.save(filepath)
+        # 分块流式写入，避免大文件占用过多内存
+        with open(filepath, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, length=UPLOAD_COPY_BUFFER_SIZE)
         return filepath
     return None
 
+def expire_chunk_uploads():
+    """删除长时间未收到分块的上传任务及其已接收的数据，调用方需持有chunk_uploads_lock"""
+    now = time.time()
+    for upload_id, upload in list(chunk_uploads.items()):
+        if upload['in_flight'] or now - upload['updated_at'] <= CHUNK_UPLOAD_TTL:
+            continue
+        del chunk_uploads[upload_id]
+        for path in (upload['path'] + '.part', upload['path']):
+            if os.path.exists(path):
+                os.remove(path)
+
+def pop_chunk_upload(upload_id):
+    """取出已完成的分块上传文件路径，未完成或不存在时返回None"""
+    with chunk_uploads_lock:
+        upload = chunk_uploads.get(upload_id)
+        if not upload or not upload['completed']:
+            return None
+        del chunk_uploads[upload_id]
+        return upload['path']
+
 def get_task_status(task_id):
     """获取任务状态"""
     task = tasks.get(task_id)
@@ -77,14 +139,22 @@ def get_task_status(task_id):
     # 从任务中获取进度信息
     processor = task.get('processor')
     if not processor:
+        # 任务还在排队或正在初始化
         return {
             'progress': 0,
-            'completed': False,
-            'error': '任务未初始化'
+            'current_frame': 0,
+            'total_frames': 0,
+            'processed_frames': 0,
+            'matched_frames': 0,
+            'transcode_progress': None,
+            'is_processing': task.get('is_processing', False),
+            'completed': not task.get('is_processing', False),
+            'total_matches': 0
         }
     
-    # 获取进度
+    # 获取进度；是否完成以任务自身的状态为准，处理器在加载视频期间还未开始处理
     progress_info = processor.get_progress_info()
+    is_processing = task.get('is_processing', False)
     
     # 返回状态信息
     return {
@@ -93,9 +163,10 @@ def get_task_status(task_id):
         'total_frames': progress_info['total_frames'],
         'processed_frames': progress_info['processed_frames'],
         'matched_frames': progress_info['matched_frames'],
-        'is_processing': progress_info['is_processing'],
-        'completed': not progress_info['is_processing'],
-        'total_matches': len(processor.get_detection_results())
+        'transcode_progress': progress_info['transcode_progress'],
+        'is_processing': is_processing,
+        'completed': not is_processing,
+        'total_matches': processor.get_result_count()
     }
 
 def process_video_task(task_id, video_path, face_path, tolerance):
@@ -106,12 +177,12 @@ def process_video_task(task_id, video_path, face_path, tolerance):
             logger.error(f"任务不存在: {task_id}")
             return
         
-        # 初始化人脸检测器，使用配置中的模型
-        face_detector = FaceDetector(model=FACE_DETECTION_MODEL)
-        face_detector.tolerance = float(tolerance)
+        # 所有任务共享同一个人脸检测器，任务自己的参考人脸和阈值放在匹配上下文中
+        face_detector = FaceDetector.get_shared(model=FACE_DETECTION_MODEL)
         
         # 加载参考人脸
-        if not face_detector.load_reference_face(face_path):
+        context = face_detector.create_context(face_path, tolerance=float(tolerance))
+        if context is None:
             task['error'] = '无法加载参考人脸'
             return
         
@@ -119,7 +190,9 @@ def process_video_task(task_id, video_path, face_path, tolerance):
         processor = VideoProcessor(
             face_detector,
             max_workers=MAX_PROCESSING_THREADS,
-            frame_scale=FRAME_SCALE
+            frame_scale=FRAME_SCALE,
+            context=context,
+            result_notifier=task['notifier']
         )
         # 设置最小检测时间间隔
         processor.min_time_interval = MIN_DETECTION_INTERVAL
@@ -132,15 +205,24 @@ def process_video_task(task_id, video_path, face_path, tolerance):
         
         # 更新实时预览画面的回调函数
         def progress_callback(frame_index, total_frames, progress, current_frame):
-            # 保存当前帧为预览图像
-            if current_frame is not None and frame_index % 10 == 0:  # 每10帧更新一次预览
+            # 按时间间隔保存当前帧为预览图像，前端约每秒轮询一次，更频繁的写入没有意义
+            now = time.monotonic()
+            if current_frame is not None and now - task['last_preview_time'] >= PREVIEW_INTERVAL:
                 preview_path = os.path.join(app.config['TEMP_FOLDER'], f"preview_{task_id}.jpg")
-                cv2.imwrite(preview_path, current_frame)
+                # 处理流程中的帧为RGB格式，写入前转换回BGR（延迟标记的帧在这里才执行标记）
+                cv2.imwrite(preview_path, cv2.cvtColor(as_array(current_frame), cv2.COLOR_RGB2BGR))
                 task['preview_image'] = preview_path
+                task['preview_version'] += 1
+                task['last_preview_time'] = now
             
             # 继续处理
             return True
         
+        # 初始化期间任务可能已被停止
+        if task.get('stop_requested', False):
+            logger.info(f"任务已停止: {task_id}")
+            return
+        
         # 处理视频
         results = processor.process_video(progress_callback)
         
@@ -152,11 +234,42 @@ def process_video_task(task_id, video_path, face_path, tolerance):
         
         # 每次任务完成后清理一下临时文件
         clean_old_files(TEMP_DIR, days=1)
+        if PREVIEW_DIR != TEMP_DIR:
+            clean_old_files(PREVIEW_DIR, days=1)
     except Exception as e:
         logger.error(f"处理视频任务异常: {str(e)}")
         task['error'] = str(e)
     finally:
         task['is_processing'] = False
+        # 通知进度推送任务已结束
+        task['notifier'].notify()
+
+def stop_task(task):
+    """
+    停止任务：还在排队的任务直接取消，已开始的任务通知处理器停止
+    
+    已开始的任务只发出停止信号，is_processing保持为True，直到处理线程真正退出时
+    由process_video_task清除，期间任务不会被淘汰，其文件也不会被删除。
+    
+    Returns:
+        bool: 是否停止了任务
+    """
+    if not task.get('is_processing', False):
+        return False
+    
+    task['stop_requested'] = True
+    future = task.get('future')
+    if future and future.cancel():
+        # 任务还在排队，process_video_task不会再运行，直接结束任务
+        task['is_processing'] = False
+        task['completed'] = True
+    else:
+        processor = task.get('processor')
+        if processor:
+            processor.stop_processing()
+    
+    task['notifier'].notify()
+    return True
 
 @app.route('/')
 def index():
@@ -166,16 +279,19 @@ def index():
 @app.route('/upload', methods=['POST'])
 def upload():
     """处理文件上传"""
+    # 视频可以随表单上传，也可以先通过/upload_chunk分块上传后只提交上传ID
+    video_upload_id = request.form.get('videoUploadId')
+    
     # 检查是否有文件
-    if 'referFace' not in request.files or 'videoFile' not in request.files:
+    if 'referFace' not in request.files or ('videoFile' not in request.files and not video_upload_id):
         flash('请上传人脸照片和视频文件', 'danger')
         return jsonify({'success': False, 'error': '请上传人脸照片和视频文件'})
     
     refer_face = request.files['referFace']
-    video_file = request.files['videoFile']
+    video_file = request.files.get('videoFile')
     
     # 检查文件名
-    if refer_face.filename == '' or video_file.filename == '':
+    if refer_face.filename == '' or (not video_upload_id and video_file.filename == ''):
         flash('未选择文件', 'danger')
         return jsonify({'success': False, 'error': '未选择文件'})
     
@@ -184,7 +300,7 @@ def upload():
         flash('人脸照片格式不支持，请上传 PNG, JPG 或 JPEG 格式', 'danger')
         return jsonify({'success': False, 'error': '人脸照片格式不支持，请上传 PNG, JPG 或 JPEG 格式'})
     
-    if not allowed_file(video_file.filename, 'video'):
+    if not video_upload_id and not allowed_file(video_file.filename, 'video'):
         flash('视频格式不支持，请上传 MP4, AVI, MOV 或 MKV 格式', 'danger')
         return jsonify({'success': False, 'error': '视频格式不支持，请上传 MP4, AVI, MOV 或 MKV 格式'})
     
@@ -193,7 +309,10 @@ def upload():
     
     # 保存文件
     face_path = get_file_path(refer_face, app.config['UPLOAD_FOLDER'], 'face')
-    video_path = get_file_path(video_file, app.config['UPLOAD_FOLDER'], 'video')
+    if video_upload_id:
+        video_path = pop_chunk_upload(video_upload_id)
+    else:
+        video_path = get_file_path(video_file, app.config['UPLOAD_FOLDER'], 'video')
     
     if not face_path or not video_path:
         flash('文件保存失败', 'danger')
@@ -203,27 +322,27 @@ def upload():
     task_id = str(uuid.uuid4())
     
     # 初始化任务
-    tasks[task_id] = {
+    task = {
         'id': task_id,
         'face_path': face_path,
         'video_path': video_path,
         'tolerance': tolerance,
         'timestamp': datetime.now().isoformat(),
         'is_processing': True,
+        'stop_requested': False,
         'processor': None,
         'preview_image': None,
+        'preview_version': 0,
+        'last_preview_time': 0.0,
+        'notifier': ProgressNotifier(),
         'error': None,
         'results': [],
         'completed': False
     }
+    tasks[task_id] = task
     
-    # 启动后台处理线程
-    thread = threading.Thread(
-        target=process_video_task,
-        args=(task_id, video_path, face_path, tolerance)
-    )
-    thread.daemon = True
-    thread.start()
+    # 提交到后台线程池处理，线程都在忙时任务排队等待
+    task['future'] = EXECUTOR.submit(process_video_task, task_id, video_path, face_path, tolerance)
     
     flash('文件上传成功，开始处理', 'success')
     return jsonify({
@@ -231,39 +350,134 @@ def upload():
         'task_id': task_id
     })
 
-@app.route('/progress/<task_id>')
-def progress(task_id):
-    """获取处理进度"""
+@app.route('/upload_chunk', methods=['POST'])
+def upload_chunk():
+    """
+    分块上传视频文件
+    
+    请求体为文件的一个分块，通过Content-Range请求头指定其位置，分块必须按顺序上传。
+    第一个分块通过filename参数提供原始文件名，之后的分块通过upload_id参数指定上传任务。
+    """
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if not content_range or content_range.units != 'bytes' or content_range.length is None:
+        return jsonify({'success': False, 'error': '缺少或无效的Content-Range请求头'})
+    
+    if content_range.length > MAX_UPLOAD_SIZE:
+        return jsonify({'success': False, 'error': '视频文件过大'})
+    
+    upload_id = request.args.get('upload_id')
+    
+    with chunk_uploads_lock:
+        expire_chunk_uploads()
+        
+        if not upload_id:
+            # 第一个分块，创建上传任务
+            filename = request.args.get('filename', '')
+            if not allowed_file(filename, 'video'):
+                return jsonify({'success': False, 'error': '视频格式不支持，请上传 MP4, AVI, MOV 或 MKV 格式'})
+            if content_range.start != 0:
+                return jsonify({'success': False, 'error': '第一个分块必须从文件开头开始'})
+            
+            upload_id = str(uuid.uuid4())
+            extension = get_extension(filename)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            chunk_uploads[upload_id] = {
+                'path': os.path.join(app.config['UPLOAD_FOLDER'], f"video_{timestamp}_{upload_id[:8]}.{extension}"),
+                'received': 0,
+                'total': content_range.length,
+                'completed': False,
+                'in_flight': False,
+                'updated_at': time.time()
+            }
+        
+        upload = chunk_uploads.get(upload_id)
+        if not upload:
+            return jsonify({'success': False, 'error': '上传任务不存在'})
+        
+        if upload['in_flight']:
+            return jsonify({'success': False, 'error': '正在接收该上传任务的其他分块',
+                            'upload_id': upload_id, 'received': upload['received']})
+        
+        if (upload['completed'] or content_range.start != upload['received']
+                or content_range.length != upload['total']):
+            return jsonify({'success': False, 'error': '分块位置不连续',
+                            'upload_id': upload_id, 'received': upload['received']})
+        
+        # 领取该上传任务，接收分块期间其他分块请求会被拒绝，上传任务也不会过期
+        upload['in_flight'] = True
+        received = upload['received']
+    
+    # 在锁外读取请求体并追加写入，写入不完整或连接中断时回退，客户端可从received处重传
+    part_path = upload['path'] + '.part'
+    complete = False
+    try:
+        with open(part_path, 'ab') as out:
+            try:
+                shutil.copyfileobj(request.stream, out, length=UPLOAD_COPY_BUFFER_SIZE)
+                complete = out.tell() == content_range.stop
+            except Exception as e:
+                logger.warning(f"接收分块失败: {str(e)}")
+            if not complete:
+                out.truncate(received)
+    finally:
+        with chunk_uploads_lock:
+            upload['in_flight'] = False
+            upload['updated_at'] = time.time()
+            if complete:
+                upload['received'] = content_range.stop
+                if upload['received'] >= upload['total']:
+                    os.replace(part_path, upload['path'])
+                    upload['completed'] = True
+    
+    if not complete:
+        return jsonify({'success': False, 'error': '分块数据不完整',
+                        'upload_id': upload_id, 'received': received})
+    
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'received': upload['received'],
+        'completed': upload['completed']
+    })
+
+def build_progress(task_id, current_count=0):
+    """
+    生成任务的进度信息
+    
+    Args:
+        task_id: 任务ID
+        current_count: 前端已经显示的结果数量，只返回此后的新结果
+        
+    Returns:
+        dict: 进度信息
+    """
     task = tasks.get(task_id)
     if not task:
-        return jsonify({'success': False, 'error': '任务不存在'})
+        return {'success': False, 'error': '任务不存在'}
     
     # 获取任务状态
     status = get_task_status(task_id)
     if not status:
-        return jsonify({'success': False, 'error': '无法获取任务状态'})
+        return {'success': False, 'error': '无法获取任务状态'}
     
     # 检查是否有错误
     if task.get('error'):
-        return jsonify({
+        return {
             'success': False,
             'error': task['error'],
             'progress': 0,
             'completed': True
-        })
+        }
     
-    # 获取最新结果
+    # 获取最新结果数量
     processor = task.get('processor')
-    all_results = processor.get_detection_results() if processor else []
-    
-    # 计算新增结果（前端可能已经显示了部分结果）
-    current_count = int(request.args.get('current_count', 0))
+    total_matches = processor.get_result_count() if processor else 0
     
     # 确保current_count不超过结果总数
-    current_count = min(current_count, len(all_results))
+    current_count = min(current_count, total_matches)
     
-    # 获取新结果
-    new_results = all_results[current_count:] if current_count < len(all_results) else []
+    # 只获取新结果，不复制整个结果列表
+    new_results = processor.get_detection_results(current_count, total_matches) if processor else []
     
     # 转换结果为前端格式
     formatted_results = []
@@ -287,20 +501,58 @@ def progress(task_id):
     if task.get('preview_image'):
         preview_path = Path(task['preview_image'])
         preview_filename = preview_path.name
-        preview_url = url_for('get_preview', filename=preview_filename)
+        # 预览图像更新后版本号才变化，前端据此判断是否需要重新加载
+        preview_url = url_for('get_preview', filename=preview_filename, v=task['preview_version'])
     
-    return jsonify({
+    return {
         'success': True,
         'progress': status['progress'],
         'current_frame': status['current_frame'],
         'total_frames': status['total_frames'],
         'processed_frames': status['processed_frames'],
         'matched_frames': status['matched_frames'],
-        'total_matches': len(all_results),
+        'transcode_progress': status['transcode_progress'],
+        'total_matches': total_matches,
         'new_results': formatted_results,
         'preview_image': preview_url,
         'completed': status['completed']
-    })
+    }
+
+def stream_progress(task_id, current_count):
+    """以Server-Sent Events推送进度：有新结果时立即推送，否则每隔PROGRESS_STREAM_INTERVAL秒推送一次"""
+    task = tasks.get(task_id)
+    notifier = task['notifier'] if task else None
+    
+    # 每个连接记录自己看到的版本号，先读取版本号再读取进度，不会漏掉两者之间的通知
+    version = notifier.version if notifier else 0
+    while True:
+        data = build_progress(task_id, current_count)
+        yield f"data: {json.dumps(data)}\n\n"
+        
+        if not data['success'] or data['completed']:
+            return
+        current_count += len(data['new_results'])
+        
+        version = notifier.wait(version, PROGRESS_STREAM_INTERVAL)
+
+@app.route('/progress/<task_id>')
+def progress(task_id):
+    """获取处理进度，请求头为text/event-stream时以SSE持续推送，否则返回一次JSON"""
+    # 计算新增结果（前端可能已经显示了部分结果）
+    current_count = int(request.args.get('current_count', 0))
+    
+    if request.accept_mimetypes.best == 'text/event-stream':
+        # 生成器中需要调用url_for，用stream_with_context在流式响应期间保留请求上下文
+        response = Response(
+            stream_with_context(stream_progress(task_id, current_count)),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        # 禁止反向代理缓冲事件流
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    return jsonify(build_progress(task_id, current_count))
 
 @app.route('/stop', methods=['POST'])
 def stop_processing():
@@ -310,10 +562,7 @@ def stop_processing():
     # 如果没有指定任务ID，尝试停止所有任务
     if not task_id:
         for task in tasks.values():
-            processor = task.get('processor')
-            if processor and task.get('is_processing', False):
-                processor.stop_processing()
-                task['is_processing'] = False
+            stop_task(task)
         return jsonify({'success': True, 'message': '所有任务已停止'})
     
     # 停止指定任务
@@ -321,10 +570,7 @@ def stop_processing():
     if not task:
         return jsonify({'success': False, 'error': '任务不存在'})
     
-    processor = task.get('processor')
-    if processor and task.get('is_processing', False):
-        processor.stop_processing()
-        task['is_processing'] = False
+    if stop_task(task):
         return jsonify({'success': True, 'message': '任务已停止'})
     
     return jsonify({'success': False, 'error': '任务已完成或未开始'})
@@ -332,12 +578,18 @@ def stop_processing():
 @app.route('/screenshots/<filename>')
 def get_screenshot(filename):
     """获取截图文件"""
-    return send_from_directory(SCREENSHOTS_DIR, filename)
+    # 截图文件名包含时间戳和随机ID，内容不会改变，允许浏览器长期缓存
+    response = send_from_directory(SCREENSHOTS_DIR, filename, conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 @app.route('/temp/<filename>')
 def get_preview(filename):
     """获取预览图像"""
-    return send_from_directory(app.config['TEMP_FOLDER'], filename)
+    # 预览图像会被覆盖，每次都需要验证，但内容未变时可以返回304
+    response = send_from_directory(app.config['TEMP_FOLDER'], filename, conditional=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/results/<task_id>')
 def get_results(task_id):
@@ -3,12 +3,21 @@
 """
 import os
 import logging
+import functools
 from pathlib import Path
 from dotenv import load_dotenv
 
 # 加载.env文件
 load_dotenv()
 
+# 每个库内部线程池的线程数。检测由多个Python线程并行执行，OpenCV/OpenMP再各自开线程会
+# 导致线程数成倍增长、CPU浪费在上下文切换上。OMP_NUM_THREADS只在OpenMP初始化前设置才生效，
+# 因此进程中第一次导入cv2、dlib之前必须已经导入本模块。各模块自身的导入顺序不影响这一点，
+# 起作用的只有程序入口：app.py在导入cv2和各功能模块之前先导入本模块，其他入口也需要这样做。
+# 已在环境变量中设置的值不会被覆盖。OpenCV用0表示不使用内部线程池，OpenMP的线程数则至少为1
+OPENCV_NUM_THREADS = int(os.getenv('OPENCV_NUM_THREADS', 1))
+os.environ.setdefault('OMP_NUM_THREADS', str(max(1, OPENCV_NUM_THREADS)))
+
 # 基础路径
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -25,41 +34,91 @@ SCREENSHOTS_DIR = OUTPUT_PATH / 'screenshots'
 LOGS_DIR = OUTPUT_PATH / 'logs'
 TEMP_DIR = OUTPUT_PATH / 'temp'
 UPLOADS_DIR = OUTPUT_PATH / 'uploads'
+EMBEDDINGS_DIR = OUTPUT_PATH / 'embeddings'
+TRANSCODE_DIR = OUTPUT_PATH / 'transcode'
+# 预览图像目录：Linux下默认放在内存文件系统（/dev/shm），避免频繁写盘
+_DEFAULT_PREVIEW_DIR = Path('/dev/shm/face_temp') if os.path.isdir('/dev/shm') else TEMP_DIR
+PREVIEW_DIR = Path(os.getenv('PREVIEW_DIR', _DEFAULT_PREVIEW_DIR))
+
+
+@functools.cache
+def _ensure_dir(path):
+    """创建目录（同一路径只创建一次）"""
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
 
 # 确保目录存在
-OUTPUT_PATH.mkdir(exist_ok=True)
-SCREENSHOTS_DIR.mkdir(exist_ok=True)
-LOGS_DIR.mkdir(exist_ok=True)
-TEMP_DIR.mkdir(exist_ok=True)
-UPLOADS_DIR.mkdir(exist_ok=True)
+for _dir in (OUTPUT_PATH, SCREENSHOTS_DIR, LOGS_DIR, TEMP_DIR, UPLOADS_DIR, EMBEDDINGS_DIR, TRANSCODE_DIR, PREVIEW_DIR):
+    _ensure_dir(_dir)
+
+# 截图JPEG质量（1-100）
+SCREENSHOT_JPEG_QUALITY = int(os.getenv('SCREENSHOT_JPEG_QUALITY', 85))
 
 # 文件保留天数（0表示不自动清理）
 FILE_RETENTION_DAYS = int(os.getenv('FILE_RETENTION_DAYS', 7))
 
+# 预览图像最小更新间隔（秒）
+PREVIEW_INTERVAL = float(os.getenv('PREVIEW_INTERVAL', 0.5))
+
+# 进度推送（SSE）在没有新结果时的最长推送间隔（秒）
+PROGRESS_STREAM_INTERVAL = float(os.getenv('PROGRESS_STREAM_INTERVAL', 0.5))
+
+# 内存中保留的最大任务数，以及已完成任务的过期时间（秒，从最近一次访问开始计算）
+TASK_CACHE_SIZE = int(os.getenv('TASK_CACHE_SIZE', 128))
+TASK_TTL = int(os.getenv('TASK_TTL', 3600))
+
 # 检测结果最小时间间隔（秒）
 MIN_DETECTION_INTERVAL = float(os.getenv('MIN_DETECTION_INTERVAL', 2.0))
 
 # 上传文件大小限制（MB）
 MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 600)) * 1024 * 1024
+# 分块上传的过期时间（秒，从最近一次收到分块开始计算），过期后删除已接收的数据
+CHUNK_UPLOAD_TTL = int(os.getenv('CHUNK_UPLOAD_TTL', 3600))
 
 # 性能优化相关设置
 MAX_PROCESSING_THREADS = int(os.getenv('MAX_PROCESSING_THREADS', 4))
+# 同时处理的视频任务数，超出的任务排队等待
+MAX_CONCURRENT_TASKS = int(os.getenv('MAX_CONCURRENT_TASKS', 1))
 FRAME_SCALE = float(os.getenv('FRAME_SCALE', 0.5))
+# 检测时的目标高度（像素），高分辨率视频会进一步缩小到该高度，0表示只使用FRAME_SCALE
+DETECTION_TARGET_HEIGHT = int(os.getenv('DETECTION_TARGET_HEIGHT', 720))
 FACE_DETECTION_MODEL = os.getenv('FACE_DETECTION_MODEL', 'hog')
+# 是否使用int8量化特征预筛选人脸距离（阈值过小时自动使用浮点计算）
+INT8_MATCHING = os.getenv('INT8_MATCHING', 'true').lower() in ('1', 'true', 'yes')
+# 跳过不需要检测的帧时只调用grab()而不转换像素（个别编码无法可靠grab时可关闭，改为逐帧完整读取）
+FRAME_GRAB_SKIP = os.getenv('FRAME_GRAB_SKIP', 'true').lower() in ('1', 'true', 'yes')
+# 检测间隔大于平均关键帧间隔时，跳转到采样帧之前最近的关键帧，而不是逐帧grab()（需要ffprobe）
+KEYFRAME_SEEK = os.getenv('KEYFRAME_SEEK', 'true').lower() in ('1', 'true', 'yes')
+# 检测缩放比例不超过SCAN_TRANSCODE_MAX_SCALE的H.264/H.265视频，先用ffmpeg转码为检测尺寸的MJPEG再扫描
+# （转码结果按视频文件的大小、修改时间和首尾内容缓存，重复扫描时直接使用；截图也会保存为检测尺寸）
+SCAN_TRANSCODE = os.getenv('SCAN_TRANSCODE', 'false').lower() in ('1', 'true', 'yes')
+SCAN_TRANSCODE_MAX_SCALE = float(os.getenv('SCAN_TRANSCODE_MAX_SCALE', 0.5))
+# 视频解码后端（'auto'优先使用PyAV，未安装时回退到OpenCV；'pyav'；'nvdec'使用ffmpegcv在GPU上解码和缩放；'opencv'）
+VIDEO_DECODE_BACKEND = os.getenv('VIDEO_DECODE_BACKEND', 'auto')
+# 是否尝试使用硬件（NVDEC）解码
+VIDEO_HWACCEL = os.getenv('VIDEO_HWACCEL', 'true').lower() in ('1', 'true', 'yes')
+# OpenCV后端FFmpeg解码使用的线程数（0表示由FFmpeg按CPU核心数决定）
+VIDEO_DECODE_THREADS = int(os.getenv('VIDEO_DECODE_THREADS', 0))
+# 每批送入检测器的帧数（'cnn'模型在GPU上批量检测，'hog'模型逐帧检测）
+DETECTION_BATCH_SIZE = int(os.getenv('DETECTION_BATCH_SIZE', 8))
+# 解码线程最多领先写入线程的批次数（另加检测线程数个正在检测的批次）
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 8))
 
 # 日志配置
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 LOG_FILE = LOGS_DIR / 'app.log'
 
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志：已配置过处理器时跳过（例如模块以不同路径被重复导入），避免每条日志重复写入
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
 
 # 获取logger
 logger = logging.getLogger('face_monitor') 
\ No newline at end of file
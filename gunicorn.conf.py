@@ -0,0 +1,16 @@
+"""
+Gunicorn配置文件
+
+使用方法：gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# 任务状态保存在进程内存中，只能使用一个工作进程
+workers = 1
+
+# 视频处理在后台线程中执行且是CPU密集型的，gevent的猴子补丁会把这些线程变成协程、
+# 阻塞整个事件循环，因此使用线程工作模式；每个SSE进度连接占用一个线程
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
@@ -0,0 +1,103 @@
+"""
+有界队列模块，提供比queue.Queue更轻量的线程间队列
+"""
+import time
+import threading
+from collections import deque
+from queue import Empty, Full
+
+
+class BoundedDeque:
+    """
+    基于deque和Condition的有界阻塞队列
+
+    接口与queue.Queue的常用部分保持一致（put/get/task_done/join/qsize），
+    队列满或空时同样抛出queue.Full/queue.Empty，可直接替换使用。
+    所有操作只使用一把锁，省去queue.Queue内部的多层方法调用。
+    """
+
+    def __init__(self, maxsize=0):
+        """
+        初始化队列
+
+        Args:
+            maxsize: 最大长度，小于等于0表示不限制
+        """
+        self.maxsize = maxsize
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+
+    def _wait(self, condition, predicate, timeout, exception):
+        """在持有锁的情况下等待条件成立，超时抛出指定异常"""
+        if predicate():
+            return
+        if timeout is None:
+            while not predicate():
+                condition.wait()
+            return
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise exception
+            condition.wait(remaining)
+
+    def put(self, item, timeout=None):
+        """
+        放入数据，队列满时阻塞等待
+
+        Args:
+            item: 数据
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Raises:
+            queue.Full: 超时后队列仍然是满的
+        """
+        with self._lock:
+            if self.maxsize > 0:
+                self._wait(self._not_full, lambda: len(self._items) < self.maxsize, timeout, Full)
+            self._items.append(item)
+            self._unfinished += 1
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """
+        取出数据，队列为空时阻塞等待
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            最早放入的数据
+
+        Raises:
+            queue.Empty: 超时后队列仍然为空
+        """
+        with self._lock:
+            self._wait(self._not_empty, lambda: self._items, timeout, Empty)
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+    def task_done(self):
+        """标记一个取出的数据已处理完成"""
+        with self._lock:
+            if self._unfinished <= 0:
+                raise ValueError('task_done()调用次数超过放入的数据数')
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._all_done.notify_all()
+
+    def join(self):
+        """等待所有放入的数据都处理完成"""
+        with self._lock:
+            while self._unfinished:
+                self._all_done.wait()
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
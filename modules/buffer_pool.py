@@ -0,0 +1,65 @@
+"""
+缓冲区池模块，复用固定尺寸的图像数组，减少逐帧的内存分配
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    固定形状的numpy数组池
+
+    acquire()优先取出空闲的数组，没有时新分配；数组用完后调用release()放回。
+    空闲数组最多保留max_buffers个，形状不符的数组直接丢弃。
+    outstanding为已取出尚未放回的数组数，用于检查各处理阶段是否都放回了缓冲区。
+    """
+
+    def __init__(self, shape, dtype=np.uint8, max_buffers=16):
+        """
+        初始化缓冲区池
+
+        Args:
+            shape: 数组形状
+            dtype: 数组类型
+            max_buffers: 最多保留的空闲数组数
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.max_buffers = max_buffers
+        self._free = deque()
+        self._lock = threading.Lock()
+        self._outstanding = 0
+
+    @property
+    def outstanding(self):
+        """已取出且尚未放回的数组数"""
+        return self._outstanding
+
+    def acquire(self):
+        """
+        取出一个数组（内容未初始化）
+
+        Returns:
+            numpy.ndarray: 形状为shape的数组
+        """
+        with self._lock:
+            self._outstanding += 1
+            if self._free:
+                return self._free.pop()
+        return np.empty(self.shape, dtype=self.dtype)
+
+    def release(self, buffer):
+        """
+        放回不再使用的数组
+
+        Args:
+            buffer: acquire()取出的数组
+        """
+        if buffer is None or buffer.shape != self.shape or buffer.dtype != self.dtype:
+            return
+        with self._lock:
+            self._outstanding -= 1
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
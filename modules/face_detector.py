@@ -2,16 +2,75 @@
 人脸检测模块，负责人脸识别和匹配相关功能
 """
 import os
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
 import cv2
+import dlib
 import numpy as np
 import face_recognition
 
-from config import logger, FACE_TOLERANCE
+from config import logger, FACE_TOLERANCE, INT8_MATCHING, EMBEDDINGS_DIR
 from modules.utils import load_image, save_image
 
+# 参考人脸特征缓存按缓存文件分别加锁：同一参考图像的并发任务只提取一次特征，
+# 不同参考图像的特征提取互不阻塞。值为[锁, 使用者数]，没有使用者时删除
+_embedding_cache_locks = {}
+_embedding_cache_locks_lock = threading.Lock()
+
+@contextmanager
+def _embedding_cache_lock(key):
+    """持有某个参考人脸特征缓存文件的锁"""
+    with _embedding_cache_locks_lock:
+        entry = _embedding_cache_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _embedding_cache_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _embedding_cache_locks[key]
+
+
+# 进程内共享的人脸检测器（按模型区分）
+_shared_detectors = {}
+_shared_detectors_lock = threading.Lock()
+
+
+@dataclass
+class DetectionContext:
+    """单个任务的匹配状态：参考人脸特征、匹配阈值，以及用于距离预筛选的int8量化特征"""
+    reference_face_encoding: np.ndarray
+    tolerance: float = FACE_TOLERANCE
+    reference_face_path: str = None
+    quant_scale: float = field(init=False)
+    reference_face_q: np.ndarray = field(init=False)
+    reference_face_q_norm: int = field(init=False)
+    
+    def __post_init__(self):
+        # 以连续的float32数组保存，减少距离计算的内存带宽
+        self.reference_face_encoding = np.ascontiguousarray(self.reference_face_encoding, dtype=np.float32)
+        
+        # 将参考人脸特征量化为int8，并预先计算其平方范数
+        abs_max = float(np.abs(self.reference_face_encoding).max()) or 1.0
+        self.quant_scale = 127.0 / abs_max
+        self.reference_face_q = np.round(self.reference_face_encoding * self.quant_scale).astype(np.int8)
+        ref_q = self.reference_face_q.astype(np.int32)
+        self.reference_face_q_norm = int(ref_q @ ref_q)
+
 
 class FaceDetector:
-    """人脸检测器类，提供人脸检测和匹配功能"""
+    """
+    人脸检测器类，提供人脸检测和匹配功能
+    
+    检测器本身不保存任务相关的状态，参考人脸和阈值放在DetectionContext中按参数传入，
+    因此可以通过get_shared()在多个任务间共享同一个实例。未传入ctx时使用
+    load_reference_face()加载到实例上的默认上下文。
+    """
     
     def __init__(self, reference_face_path=None, model='hog'):
         """
@@ -21,18 +80,38 @@ class FaceDetector:
             reference_face_path: 参考人脸图像的路径
             model: 人脸检测模型，'hog'速度更快，'cnn'精度更高
         """
-        self.reference_face_path = reference_face_path
-        self.reference_face_encoding = None
+        self.context = None
         self.tolerance = FACE_TOLERANCE
         self.model = model  # 使用'hog'模型速度更快，'cnn'精度更高但需要GPU
+        # 检测实际运行的设备：只有'cnn'模型且dlib编译时启用了CUDA才在GPU上运行。
+        # dlib只接受主机内存中的numpy数组，即使在GPU上运行，输入帧也必须先拷贝回主机
+        self.device = 'cuda' if model == 'cnn' and getattr(dlib, 'DLIB_USE_CUDA', False) else 'cpu'
         
         # 如果提供了参考人脸，立即加载
         if reference_face_path:
             self.load_reference_face(reference_face_path)
     
+    @classmethod
+    def get_shared(cls, model='hog'):
+        """
+        获取进程内共享的人脸检测器
+        
+        Args:
+            model: 人脸检测模型
+            
+        Returns:
+            FaceDetector: 共享的检测器实例
+        """
+        with _shared_detectors_lock:
+            detector = _shared_detectors.get(model)
+            if detector is None:
+                detector = cls(model=model)
+                _shared_detectors[model] = detector
+            return detector
+    
     def load_reference_face(self, face_path):
         """
-        加载参考人脸图像并提取特征
+        加载参考人脸图像并提取特征，作为该实例的默认上下文
         
         Args:
             face_path: 参考人脸图像的路径
@@ -40,42 +119,110 @@ class FaceDetector:
         Returns:
             bool: 是否成功加载
         """
+        ctx = self.create_context(face_path, self.tolerance)
+        if ctx is None:
+            return False
+        self.context = ctx
+        return True
+    
+    def create_context(self, face_path, tolerance=None):
+        """
+        加载参考人脸图像并提取特征，生成一个任务的匹配上下文
+        
+        Args:
+            face_path: 参考人脸图像的路径
+            tolerance: 匹配阈值，None表示使用检测器的默认阈值
+            
+        Returns:
+            DetectionContext: 匹配上下文，失败时返回None
+        """
         try:
             if not os.path.exists(face_path):
                 logger.error(f"参考人脸图像不存在: {face_path}")
-                return False
-                
-            # 加载图像
-            image = load_image(face_path)
-            if image is None:
-                return False
-                
-            # 转换为RGB（face_recognition库需要RGB格式）
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                return None
             
-            # 检测人脸位置
-            face_locations = face_recognition.face_locations(rgb_image, model=self.model)
+            # 按图像内容哈希缓存特征，同一参考图像重复使用时跳过检测和特征提取
+            with open(face_path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            cache_path = EMBEDDINGS_DIR / f"{digest}_{self.model}.npy"
             
-            if not face_locations:
-                logger.error(f"未在参考图像中检测到人脸: {face_path}")
-                return False
-                
-            # 提取人脸特征
-            self.reference_face_encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
-            self.reference_face_path = face_path
+            with _embedding_cache_lock(cache_path.name):
+                encoding = self._load_cached_encoding(cache_path)
+                if encoding is None:
+                    encoding = self._extract_reference_encoding(face_path)
+                    if encoding is None:
+                        return None
+                    self._save_cached_encoding(cache_path, encoding)
+            
+            ctx = DetectionContext(
+                reference_face_encoding=encoding,
+                tolerance=self.tolerance if tolerance is None else float(tolerance),
+                reference_face_path=face_path
+            )
             
             logger.info(f"成功加载参考人脸: {face_path}")
-            return True
+            return ctx
         except Exception as e:
             logger.error(f"加载参考人脸失败: {str(e)}")
-            return False
+            return None
+    
+    def _extract_reference_encoding(self, face_path):
+        """
+        检测参考图像中的人脸并提取特征
+        
+        Args:
+            face_path: 参考人脸图像的路径
             
-    def detect_faces(self, image):
+        Returns:
+            numpy.ndarray: 第一个人脸的特征，失败时返回None
+        """
+        # 加载图像
+        image = load_image(face_path)
+        if image is None:
+            return None
+            
+        # 转换为RGB（face_recognition库需要RGB格式）
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        
+        # 检测人脸位置
+        face_locations = face_recognition.face_locations(rgb_image, model=self.model)
+        
+        if not face_locations:
+            logger.error(f"未在参考图像中检测到人脸: {face_path}")
+            return None
+            
+        # 提取人脸特征
+        return face_recognition.face_encodings(rgb_image, face_locations)[0]
+    
+    def _load_cached_encoding(self, cache_path):
+        """从磁盘缓存加载参考人脸特征，不存在或损坏时返回None"""
+        if not cache_path.exists():
+            return None
+        try:
+            encoding = np.load(cache_path)
+            logger.info(f"使用缓存的参考人脸特征: {cache_path}")
+            return encoding
+        except Exception as e:
+            logger.warning(f"读取参考人脸特征缓存失败: {str(e)}")
+            return None
+    
+    def _save_cached_encoding(self, cache_path, encoding):
+        """把参考人脸特征写入磁盘缓存，先写临时文件再替换，避免留下不完整的缓存"""
+        try:
+            tmp_path = cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, encoding)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"写入参考人脸特征缓存失败: {str(e)}")
+            
+    def detect_faces(self, image, rgb=False):
         """
         在图像中检测所有人脸
         
         Args:
             image: OpenCV格式的图像
+            rgb: 图像是否已经是RGB格式，是则跳过颜色转换
             
         Returns:
             tuple: (face_locations, face_encodings)
@@ -86,7 +233,7 @@ class FaceDetector:
             
         try:
             # 转换为RGB格式
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            rgb_image = image if rgb else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # 检测人脸位置
             face_locations = face_recognition.face_locations(rgb_image, model=self.model)
@@ -103,18 +250,110 @@ class FaceDetector:
             logger.error(f"检测人脸异常: {str(e)}")
             return [], []
     
-    def match_faces(self, image, preprocess=True):
+    def preprocess_image(self, image, rgb=False):
+        """
+        图像预处理：降噪并增强对比度，提高检测效果
+        
+        Args:
+            image: OpenCV格式的图像
+            rgb: 图像是否为RGB格式
+            
+        Returns:
+            预处理后的图像，颜色格式与输入一致
+        """
+        # 降噪
+        image = cv2.fastNlMeansDenoisingColored(image, None, 10, 10, 7, 21)
+        
+        # 增强对比度
+        lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB if rgb else cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+        cl = clahe.apply(l)
+        updated_lab = cv2.merge((cl, a, b))
+        return cv2.cvtColor(updated_lab, cv2.COLOR_LAB2RGB if rgb else cv2.COLOR_LAB2BGR)
+    
+    def _resolve_context(self, ctx):
+        """未传入上下文时使用实例的默认上下文"""
+        return self.context if ctx is None else ctx
+    
+    @staticmethod
+    def _use_quantized(ctx):
+        """
+        是否使用int8量化距离预筛选
+        
+        每个分量的量化误差不超过0.5/scale，两个特征距离的误差上限为sqrt(dim)/scale。
+        阈值很小时这个误差相对阈值过大，预筛选失去意义，直接使用浮点距离。
+        """
+        if not INT8_MATCHING:
+            return False
+        margin = np.sqrt(ctx.reference_face_q.shape[0]) / ctx.quant_scale
+        return margin <= ctx.tolerance * 0.25
+    
+    def match_encodings(self, face_encodings, ctx=None):
+        """
+        找出与参考人脸匹配的人脸特征
+        
+        启用int8量化时，先用与参考人脸相同的比例量化候选特征，以整数点积
+        （||a-b||² = ||a||² + ||b||² - 2a·b）计算近似距离并按阈值加上误差上限预筛选，
+        再对少量候选用float32精确计算距离，结果与浮点计算一致。
+        
+        Args:
+            face_encodings: 人脸特征列表或(N, 128)数组
+            ctx: 匹配上下文，None表示使用实例的默认上下文
+            
+        Returns:
+            tuple: (匹配的特征索引数组, 对应的距离数组)
+        """
+        ctx = self._resolve_context(ctx)
+        encodings = np.asarray(face_encodings, dtype=np.float32)
+        
+        if self._use_quantized(ctx):
+            q = np.clip(np.round(encodings * ctx.quant_scale), -127, 127).astype(np.int8)
+            q32 = q.astype(np.int32)
+            dist_sq = np.einsum('ij,ij->i', q32, q32) + ctx.reference_face_q_norm \
+                - 2 * (q32 @ ctx.reference_face_q.astype(np.int32))
+            # 阈值加上量化误差上限，保证不会漏掉真正匹配的人脸
+            threshold = ctx.tolerance * ctx.quant_scale + np.sqrt(q.shape[1])
+            candidates = np.flatnonzero(dist_sq < threshold * threshold)
+            
+            distances = np.linalg.norm(encodings[candidates] - ctx.reference_face_encoding, axis=1)
+            keep = distances < ctx.tolerance
+            return candidates[keep], distances[keep]
+        
+        distances = self.face_distances(encodings, ctx)
+        indices = np.flatnonzero(distances < ctx.tolerance)
+        return indices, distances[indices]
+    
+    def face_distances(self, face_encodings, ctx=None):
+        """
+        计算多个人脸特征与参考人脸的欧氏距离
+        
+        Args:
+            face_encodings: 人脸特征列表或(N, 128)数组
+            ctx: 匹配上下文，None表示使用实例的默认上下文
+            
+        Returns:
+            numpy.ndarray: 长度为N的距离数组
+        """
+        ctx = self._resolve_context(ctx)
+        encodings = np.asarray(face_encodings, dtype=np.float32)
+        return np.linalg.norm(encodings - ctx.reference_face_encoding, axis=1)
+    
+    def match_faces(self, image, ctx=None, preprocess=True, rgb=False):
         """
         在图像中查找与参考人脸匹配的人脸
         
         Args:
             image: OpenCV格式的图像
+            ctx: 匹配上下文，None表示使用实例的默认上下文
             preprocess: 是否预处理图像
+            rgb: 图像是否已经是RGB格式
             
         Returns:
             list: 匹配的人脸位置列表
         """
-        if self.reference_face_encoding is None:
+        ctx = self._resolve_context(ctx)
+        if ctx is None:
             logger.error("匹配人脸失败: 未加载参考人脸")
             return []
             
@@ -125,44 +364,102 @@ class FaceDetector:
         try:
             # 图像预处理，提高检测效果
             if preprocess:
-                # 降噪
-                image = cv2.fastNlMeansDenoisingColored(image, None, 10, 10, 7, 21)
-                
-                # 增强对比度
-                lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-                l, a, b = cv2.split(lab)
-                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-                cl = clahe.apply(l)
-                updated_lab = cv2.merge((cl, a, b))
-                image = cv2.cvtColor(updated_lab, cv2.COLOR_LAB2BGR)
+                image = self.preprocess_image(image, rgb=rgb)
             
             # 检测所有人脸
-            face_locations, face_encodings = self.detect_faces(image)
+            face_locations, face_encodings = self.detect_faces(image, rgb=rgb)
             
             if not face_encodings:
                 return []
                 
-            # 匹配人脸
-            matches = []
-            for i, face_encoding in enumerate(face_encodings):
-                # 计算与参考人脸的距离
-                distance = face_recognition.face_distance([self.reference_face_encoding], face_encoding)[0]
-                
-                # 如果距离小于阈值，认为是匹配的
-                if distance < self.tolerance:
-                    matches.append({
-                        'location': face_locations[i],
-                        'distance': distance
-                    })
-            
-            return matches
+            # 一次性计算所有人脸与参考人脸的距离，距离小于阈值认为是匹配的
+            indices, distances = self.match_encodings(face_encodings, ctx)
+            return [
+                {'location': face_locations[i], 'distance': float(distance)}
+                for i, distance in zip(indices, distances)
+            ]
         except Exception as e:
             logger.error(f"匹配人脸异常: {str(e)}")
             return []
     
-    def draw_face_rectangles(self, image, face_locations, color=(0, 255, 0), thickness=2):
+    def match_faces_batch(self, images, ctx=None, preprocess=False, rgb=False):
         """
-        在图像上绘制人脸框
+        批量查找多帧图像中与参考人脸匹配的人脸
+        
+        'cnn'模型下整批图像一次送入dlib的CNN检测器（GPU上可分摊调用开销），
+        'hog'模型则逐帧检测，作为CPU回退方案。特征只对检测到人脸的帧提取，
+        所有候选特征与参考人脸的距离一次性向量化计算。
+        
+        Args:
+            images: OpenCV格式的图像列表，尺寸必须一致
+            ctx: 匹配上下文，None表示使用实例的默认上下文
+            preprocess: 是否预处理图像
+            rgb: 图像是否已经是RGB格式，是则跳过颜色转换
+            
+        Returns:
+            list: 与images一一对应的匹配人脸列表
+        """
+        ctx = self._resolve_context(ctx)
+        if ctx is None:
+            logger.error("匹配人脸失败: 未加载参考人脸")
+            return [[] for _ in images]
+            
+        if not images:
+            return []
+            
+        try:
+            if preprocess:
+                images = [self.preprocess_image(image, rgb=rgb) for image in images]
+            
+            # 转换为RGB格式
+            rgb_images = images if rgb else [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images]
+            
+            # 检测人脸位置
+            if self.model == 'cnn':
+                batch_locations = face_recognition.batch_face_locations(
+                    rgb_images,
+                    number_of_times_to_upsample=1,
+                    batch_size=len(rgb_images)
+                )
+            else:
+                batch_locations = [
+                    face_recognition.face_locations(rgb_image, model=self.model)
+                    for rgb_image in rgb_images
+                ]
+            
+            # 只对检测到人脸的帧提取特征，并记录每个特征所属的帧
+            owners = []
+            locations = []
+            encodings = []
+            for i, (rgb_image, face_locations) in enumerate(zip(rgb_images, batch_locations)):
+                if not face_locations:
+                    continue
+                face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+                owners.extend([i] * len(face_encodings))
+                locations.extend(face_locations)
+                encodings.extend(face_encodings)
+            
+            results = [[] for _ in images]
+            if not encodings:
+                return results
+            
+            # 一次性计算整批特征与参考人脸的距离
+            indices, distances = self.match_encodings(encodings, ctx)
+            
+            for i, distance in zip(indices, distances):
+                results[owners[i]].append({
+                    'location': locations[i],
+                    'distance': float(distance)
+                })
+            
+            return results
+        except Exception as e:
+            logger.error(f"批量匹配人脸异常: {str(e)}")
+            return [[] for _ in images]
+    
+    def draw_face_rectangles_inplace(self, image, face_locations, color=(0, 255, 0), thickness=2):
+        """
+        直接在图像上绘制人脸框（不复制图像，调用方如需保留原图应自行复制）
         
         Args:
             image: OpenCV格式的图像
@@ -171,13 +468,12 @@ class FaceDetector:
             thickness: 线条粗细
             
         Returns:
-            标记后的图像
+            标记后的图像（即传入的image）
         """
         if image is None or not face_locations:
             return image
             
-        # 创建图像的副本
-        result = image.copy()
+        result = image
         
         # 绘制每个人脸的矩形
         for location in face_locations:
@@ -203,18 +499,20 @@ class FaceDetector:
         
         return result
     
-    def process_frame(self, frame, preprocess=False):
+    def process_frame(self, frame, ctx=None, preprocess=False):
         """
         处理视频帧，检测匹配的人脸并标记
         
         Args:
             frame: 视频帧
+            ctx: 匹配上下文，None表示使用实例的默认上下文
             preprocess: 是否进行图像预处理
             
         Returns:
             tuple: (processed_frame, matches, has_matches)
         """
-        if self.reference_face_encoding is None:
+        ctx = self._resolve_context(ctx)
+        if ctx is None:
             logger.warning("处理帧失败: 未加载参考人脸")
             return frame, [], False
             
@@ -224,14 +522,14 @@ class FaceDetector:
             
         try:
             # 匹配人脸
-            matches = self.match_faces(frame, preprocess=preprocess)
+            matches = self.match_faces(frame, ctx, preprocess=preprocess)
             
             # 如果有匹配的人脸，标记它们
             if matches:
-                frame = self.draw_face_rectangles(frame, matches)
+                frame = self.draw_face_rectangles_inplace(frame, matches)
                 return frame, matches, True
             else:
                 return frame, [], False
         except Exception as e:
             logger.error(f"处理帧异常: {str(e)}")
-            return frame, [], False 
\ No newline at end of file
+            return frame, [], False
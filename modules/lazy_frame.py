@@ -0,0 +1,61 @@
+"""
+延迟求值的图像帧模块，像素只在真正读取时才计算
+"""
+import numpy as np
+
+
+class LazyFrame:
+    """
+    持有原始帧和一组延迟执行的操作
+
+    操作为(func, args)，按顺序执行func(frame, *args)并以返回值作为下一步的输入。
+    通过np.asarray()读取像素时才执行全部操作并缓存结果；从未读取的帧不产生任何开销。
+    操作可以直接修改原始帧，因此原始帧放回缓冲区池之前必须完成读取。
+    """
+
+    __slots__ = ('_source', '_operations', '_result')
+
+    def __init__(self, source, operations=()):
+        """
+        初始化延迟帧
+
+        Args:
+            source: 原始帧
+            operations: 延迟执行的操作列表，元素为(func, args)
+        """
+        self._source = source
+        self._operations = list(operations)
+        self._result = None
+
+    @property
+    def shape(self):
+        """操作执行前的帧形状（标记等操作不改变形状）"""
+        return self._source.shape if self._result is None else self._result.shape
+
+    def materialize(self):
+        """
+        执行所有延迟操作并返回结果，结果会被缓存
+
+        Returns:
+            numpy.ndarray: 处理后的帧
+        """
+        if self._result is None:
+            frame = self._source
+            for func, args in self._operations:
+                frame = func(frame, *args)
+            self._result = frame
+            self._operations = []
+        return self._result
+
+    def __array__(self, dtype=None, copy=None):
+        frame = self.materialize()
+        if dtype is not None and frame.dtype != dtype:
+            return frame.astype(dtype)
+        return frame
+
+
+def as_array(frame):
+    """返回帧的像素数组，LazyFrame在此时才执行延迟操作"""
+    if isinstance(frame, LazyFrame):
+        return frame.materialize()
+    return np.asarray(frame)
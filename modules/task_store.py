@@ -0,0 +1,139 @@
+"""
+任务存储模块，提供有容量和过期时间限制的任务字典
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from config import logger
+
+
+class TaskStore:
+    """
+    线程安全的任务存储，按最近访问顺序淘汰
+
+    超过ttl秒未被访问的任务会过期，任务数超过maxsize时淘汰最久未访问的任务。
+    正在处理中的任务不会被淘汰。任务被淘汰时调用on_evict(task_id, task)释放其资源。
+    """
+
+    def __init__(self, maxsize=128, ttl=3600, on_evict=None):
+        """
+        初始化任务存储
+
+        Args:
+            maxsize: 最大任务数
+            ttl: 任务过期时间（秒），从最近一次访问开始计算
+            on_evict: 任务被淘汰时的回调函数
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._tasks = OrderedDict()
+        self._access_times = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_evictable(task):
+        """正在处理中的任务不能被淘汰"""
+        return not task.get('is_processing', False)
+
+    def _collect_evicted(self):
+        """取出所有过期或超出容量的任务，调用方需持有锁"""
+        evicted = []
+        now = time.monotonic()
+
+        # 按访问顺序从最旧的任务开始检查
+        for task_id in list(self._tasks):
+            task = self._tasks[task_id]
+            expired = now - self._access_times[task_id] > self.ttl
+            over_size = len(self._tasks) > self.maxsize
+            if not expired and not over_size:
+                break
+            if self._is_evictable(task):
+                del self._tasks[task_id]
+                del self._access_times[task_id]
+                evicted.append((task_id, task))
+
+        return evicted
+
+    def _evict(self, evicted):
+        """在锁外调用淘汰回调，避免文件清理阻塞其他请求"""
+        for task_id, task in evicted:
+            logger.info(f"任务已过期，释放资源: {task_id}")
+            if self.on_evict:
+                try:
+                    self.on_evict(task_id, task)
+                except Exception as e:
+                    logger.error(f"释放任务资源失败: {str(e)}")
+
+    def get(self, task_id, default=None):
+        """获取任务，并刷新其访问时间"""
+        with self._lock:
+            evicted = self._collect_evicted()
+            task = self._tasks.get(task_id)
+            if task is not None:
+                self._tasks.move_to_end(task_id)
+                self._access_times[task_id] = time.monotonic()
+        self._evict(evicted)
+        return default if task is None else task
+
+    def __setitem__(self, task_id, task):
+        with self._lock:
+            self._tasks[task_id] = task
+            self._tasks.move_to_end(task_id)
+            self._access_times[task_id] = time.monotonic()
+            evicted = self._collect_evicted()
+        self._evict(evicted)
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._tasks
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tasks)
+
+    def values(self):
+        """返回所有任务的快照列表，不刷新访问时间"""
+        with self._lock:
+            return list(self._tasks.values())
+
+
+class ProgressNotifier:
+    """
+    任务进度的变更通知
+
+    每次变更把版本号加一并唤醒所有等待者。等待方各自记录上次看到的版本号，
+    同一任务的多个进度推送连接互不影响，不会像共享的Event那样被某个连接clear()掉通知。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    @property
+    def version(self):
+        """当前版本号"""
+        with self._condition:
+            return self._version
+
+    def notify(self):
+        """进度有变化时调用，唤醒所有等待者"""
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version, timeout=None):
+        """
+        等待版本号变化或超时
+
+        Args:
+            version: 调用方上次看到的版本号
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            int: 返回时的版本号
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+            return self._version
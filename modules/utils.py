@@ -2,17 +2,30 @@
 工具函数模块，提供各种辅助功能
 """
 import os
+import re
 import time
 import uuid
 import shutil
+import hashlib
+import functools
+import subprocess
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import cv2
 import numpy as np
-from PIL import Image
 
-from config import logger, SCREENSHOTS_DIR, FILE_RETENTION_DAYS, TEMP_DIR, UPLOADS_DIR
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except Exception:  # PyTurboJPEG为可选依赖（需要系统安装libjpeg-turbo），不可用时使用cv2.imwrite
+    _turbo_jpeg = None
+
+from config import (
+    logger, SCREENSHOTS_DIR, FILE_RETENTION_DAYS, TEMP_DIR, UPLOADS_DIR, PREVIEW_DIR,
+    SCREENSHOT_JPEG_QUALITY, TRANSCODE_DIR
+)
+from modules.video_io import open_video
 
 def generate_unique_filename(prefix='img', ext='jpg'):
     """
@@ -29,13 +42,14 @@ def generate_unique_filename(prefix='img', ext='jpg'):
     unique_id = str(uuid.uuid4())[:8]
     return f"{prefix}_{timestamp}_{unique_id}.{ext}"
 
-def save_image(image, prefix='detected'):
+def save_image(image, prefix='detected', rgb=False):
     """
     保存图像
     
     Args:
         image: OpenCV格式的图像
         prefix: 文件名前缀
+        rgb: 图像是否为RGB格式（默认为OpenCV的BGR格式）
         
     Returns:
         保存的文件路径
@@ -48,11 +62,18 @@ def save_image(image, prefix='detected'):
         filename = generate_unique_filename(prefix)
         filepath = SCREENSHOTS_DIR / filename
         
-        # OpenCV的BGR格式转换为RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 使用PIL保存图像
-        Image.fromarray(rgb_image).save(filepath)
+        if _turbo_jpeg is not None:
+            # 使用TurboJPEG编码，直接支持RGB/BGR输入，无需颜色转换
+            pixel_format = TJPF_RGB if rgb else TJPF_BGR
+            data = _turbo_jpeg.encode(image, quality=SCREENSHOT_JPEG_QUALITY, pixel_format=pixel_format)
+            with open(filepath, 'wb') as f:
+                f.write(data)
+        else:
+            # 使用OpenCV（libjpeg-turbo）编码，需要BGR格式
+            bgr_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR) if rgb else image
+            if not cv2.imwrite(str(filepath), bgr_image, [int(cv2.IMWRITE_JPEG_QUALITY), SCREENSHOT_JPEG_QUALITY]):
+                logger.error(f"保存图像失败: 无法写入 {filepath}")
+                return None
         
         logger.info(f"图像已保存: {filepath}")
         return filepath
@@ -120,12 +141,13 @@ def resize_image(image, width=None, height=None):
         
     return cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
 
-def get_video_properties(video_path):
+def get_video_properties(video_path, capture=None):
     """
     获取视频属性
     
     Args:
         video_path: 视频文件路径
+        capture: 已打开的视频读取器，提供时直接读取其属性，避免重复打开解码器
         
     Returns:
         包含视频属性的字典，如果出错则返回None
@@ -135,7 +157,7 @@ def get_video_properties(video_path):
             logger.error(f"视频不存在: {video_path}")
             return None
             
-        cap = cv2.VideoCapture(video_path)
+        cap = capture if capture is not None else open_video(video_path)
         if not cap.isOpened():
             logger.error(f"无法打开视频: {video_path}")
             return None
@@ -147,7 +169,8 @@ def get_video_properties(video_path):
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         duration = frame_count / fps if fps > 0 else 0
         
-        cap.release()
+        if capture is None:
+            cap.release()
         
         properties = {
             'width': width,
@@ -162,6 +185,186 @@ def get_video_properties(video_path):
         logger.error(f"获取视频属性失败: {str(e)}")
         return None
 
+def get_keyframe_indices(video_path, fps):
+    """
+    使用ffprobe获取视频关键帧的帧索引
+    
+    只读取数据包的标记，不解码视频。
+    
+    Args:
+        video_path: 视频文件路径
+        fps: 视频帧率，用于把时间戳换算为帧索引
+        
+    Returns:
+        升序的关键帧索引列表，未安装ffprobe或出错时返回None
+    """
+    if fps <= 0 or shutil.which('ffprobe') is None:
+        return None
+    
+    try:
+        output = subprocess.run(
+            [
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+            ],
+            capture_output=True, text=True, check=True
+        ).stdout
+        
+        keyframes = set()
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.add(int(round(float(pts_time) * fps)))
+        
+        return sorted(keyframes) or None
+    except Exception as e:
+        logger.error(f"获取关键帧失败: {str(e)}")
+        return None
+
+def get_video_codec(video_path):
+    """
+    使用ffprobe获取视频流的编码格式
+    
+    Args:
+        video_path: 视频文件路径
+        
+    Returns:
+        编码名称（如'h264'、'hevc'），未安装ffprobe或出错时返回None
+    """
+    if shutil.which('ffprobe') is None:
+        return None
+    
+    try:
+        output = subprocess.run(
+            [
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', video_path
+            ],
+            capture_output=True, text=True, check=True
+        ).stdout
+        return output.strip().lower() or None
+    except Exception as e:
+        logger.error(f"获取视频编码失败: {str(e)}")
+        return None
+
+@functools.cache
+def _ffmpeg_passthrough_args():
+    """
+    获取按原样保留帧时间戳的ffmpeg参数
+    
+    -fps_mode从ffmpeg 5.1开始提供，之前的版本（如Ubuntu 22.04的4.4）只支持-vsync。
+    无法识别版本号时（如自行编译的开发版）按新版本处理。
+    
+    Returns:
+        list: ffmpeg参数
+    """
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True).stdout
+        match = re.match(r'ffmpeg version n?(\d+)\.(\d+)', output)
+        if match and (int(match.group(1)), int(match.group(2))) < (5, 1):
+            return ['-vsync', 'passthrough']
+    except Exception as e:
+        logger.debug(f"获取ffmpeg版本失败: {str(e)}")
+    return ['-fps_mode', 'passthrough']
+
+def _scan_cache_key(video_path, sample_size=1024 * 1024):
+    """
+    计算扫描转码的缓存键
+    
+    由文件大小、修改时间和文件首尾各sample_size字节的哈希组成，不读取整个文件，
+    大视频也能立即判断是否有缓存。
+    
+    Args:
+        video_path: 视频文件路径
+        sample_size: 参与哈希的首尾字节数
+        
+    Returns:
+        缓存键字符串
+    """
+    stat = os.stat(video_path)
+    sha1 = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(video_path, 'rb') as f:
+        sha1.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(sample_size, stat.st_size - sample_size))
+            sha1.update(f.read(sample_size))
+    return sha1.hexdigest()
+
+def transcode_for_scan(video_path, width, height, frame_count=0, should_stop=None, progress_callback=None):
+    """
+    将视频转码为指定尺寸的MJPEG，用于快速扫描
+    
+    MJPEG每帧独立编码，解码开销远低于H.264/H.265。转码结果按视频文件和尺寸缓存，
+    同一视频再次扫描时直接使用缓存。转码保持原有的帧数和时间戳，帧索引与原视频一致。
+    转码期间通过FFmpeg的-progress输出报告进度，并定期检查是否需要停止。
+    
+    Args:
+        video_path: 视频文件路径
+        width: 输出宽度
+        height: 输出高度
+        frame_count: 原视频总帧数，用于计算进度，0表示未知
+        should_stop: 返回True时终止转码的函数
+        progress_callback: 进度回调函数，参数为0-1之间的进度
+        
+    Returns:
+        转码后的视频路径，未安装ffmpeg、转码失败或被停止时返回None
+    """
+    if shutil.which('ffmpeg') is None:
+        logger.warning("未安装ffmpeg，跳过扫描转码")
+        return None
+    
+    passthrough_args = _ffmpeg_passthrough_args()
+    tmp_path = None
+    process = None
+    try:
+        cache_path = TRANSCODE_DIR / f"{_scan_cache_key(video_path)}_{width}x{height}.mkv"
+        
+        if cache_path.exists():
+            logger.info(f"使用缓存的扫描转码: {cache_path}")
+            return str(cache_path)
+        
+        # 先写入临时文件，转码完成后再改名，避免其他任务读到不完整的文件
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{uuid.uuid4().hex[:8]}.tmp.mkv")
+        start_time = time.time()
+        # -progress每隔约0.5秒输出一组key=value，用于报告进度和检查停止信号
+        process = subprocess.Popen(
+            [
+                'ffmpeg', '-v', 'error', '-nostats', '-y', '-i', video_path,
+                '-map', '0:v:0', '-an', *passthrough_args,
+                '-vf', f'scale={width}:{height}', '-c:v', 'mjpeg', '-q:v', '5',
+                '-progress', 'pipe:1', str(tmp_path)
+            ],
+            stdout=subprocess.PIPE, text=True
+        )
+        for line in process.stdout:
+            if should_stop and should_stop():
+                process.terminate()
+                process.wait()
+                logger.info(f"扫描转码已停止: {video_path}")
+                tmp_path.unlink(missing_ok=True)
+                return None
+            key, _, value = line.strip().partition('=')
+            if key == 'frame' and frame_count > 0 and progress_callback:
+                progress_callback(min(int(value) / frame_count, 1.0))
+        
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, 'ffmpeg')
+        os.replace(tmp_path, cache_path)
+        
+        logger.info(f"扫描转码完成: {cache_path}, 耗时: {time.time() - start_time:.2f}秒")
+        return str(cache_path)
+    except Exception as e:
+        logger.error(f"扫描转码失败: {str(e)}")
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+        if tmp_path is not None and tmp_path.exists():
+            tmp_path.unlink()
+        return None
+    finally:
+        if process is not None and process.stdout:
+            process.stdout.close()
+
 def format_time(seconds):
     """
     将秒数格式化为时:分:秒格式
@@ -172,9 +375,8 @@ def format_time(seconds):
     Returns:
         格式化的时间字符串
     """
-    hours = int(seconds / 3600)
-    minutes = int((seconds % 3600) / 60)
-    seconds = int(seconds % 60)
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 def clean_old_files(directory, days=None):
@@ -204,18 +406,18 @@ def clean_old_files(directory, days=None):
         cutoff_date = datetime.now() - timedelta(days=days)
         count = 0
         
-        # 遍历目录中的所有文件
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            
-            # 只处理文件，不处理目录
-            if os.path.isfile(item_path):
-                # 获取文件的修改时间
-                mtime = datetime.fromtimestamp(os.path.getmtime(item_path))
-                
+        cutoff_timestamp = cutoff_date.timestamp()
+        
+        # 遍历目录中的所有文件，DirEntry会缓存读取目录时得到的文件信息，减少stat调用
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # 只处理文件，不处理目录
+                if not entry.is_file():
+                    continue
+                    
                 # 如果文件修改时间早于截止日期，删除它
-                if mtime < cutoff_date:
-                    os.remove(item_path)
+                if entry.stat().st_mtime < cutoff_timestamp:
+                    os.remove(entry.path)
                     count += 1
                     
         if count > 0:
@@ -238,6 +440,9 @@ def clean_all_temp_directories():
     # 清理各个目录
     total += clean_old_files(SCREENSHOTS_DIR)
     total += clean_old_files(TEMP_DIR, days=1)  # 临时文件只保留1天
+    if PREVIEW_DIR != TEMP_DIR:
+        total += clean_old_files(PREVIEW_DIR, days=1)
     total += clean_old_files(UPLOADS_DIR)
+    total += clean_old_files(TRANSCODE_DIR)
     
     return total 
\ No newline at end of file
@@ -0,0 +1,457 @@
+"""
+视频读取模块，封装不同的视频解码后端
+"""
+import os
+
+import cv2
+
+try:
+    import av
+except ImportError:  # PyAV为可选依赖，未安装时回退到OpenCV
+    av = None
+
+try:
+    import ffmpegcv
+except ImportError:  # ffmpegcv为可选依赖，仅'nvdec'后端使用
+    ffmpegcv = None
+
+from config import logger, VIDEO_DECODE_BACKEND, VIDEO_HWACCEL, VIDEO_DECODE_THREADS
+
+# OpenCV在每次打开视频时读取该环境变量作为FFmpeg的解码选项，启用帧级多线程解码；
+# 已在环境变量中设置的值不会被覆盖
+os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', f'threads;{VIDEO_DECODE_THREADS}')
+
+
+class PyAVCapture:
+    """
+    基于PyAV（FFmpeg）的视频读取器
+
+    接口与cv2.VideoCapture保持一致（isOpened/read/grab/retrieve/set/get/release），
+    可直接替换使用。支持时使用CUDA（NVDEC）硬件解码，grab()只解码不做颜色转换，
+    retrieve()才把帧转换为numpy数组。
+    """
+
+    def __init__(self, video_path, hwaccel=True):
+        """
+        初始化视频读取器
+
+        Args:
+            video_path: 视频文件路径
+            hwaccel: 是否尝试使用CUDA硬件解码
+        """
+        self.container = None
+        self.stream = None
+        self._frames = None
+        self._frame = None
+        self._pending = None
+        self._position = 0
+
+        try:
+            self.container = self._open(video_path, hwaccel)
+            self.stream = self.container.streams.video[0]
+            # 软件解码时启用FFmpeg的帧级多线程
+            self.stream.thread_type = 'AUTO'
+            self._frames = self.container.decode(self.stream)
+        except Exception as e:
+            logger.error(f"PyAV打开视频失败: {str(e)}")
+            self.release()
+
+    @staticmethod
+    def _open(video_path, hwaccel):
+        """打开容器，优先使用CUDA硬件解码，不支持时回退到软件解码"""
+        if hwaccel:
+            try:
+                from av.codec.hwaccel import HWAccel
+                return av.open(
+                    video_path,
+                    hwaccel=HWAccel(device_type='cuda', allow_software_fallback=True)
+                )
+            except Exception as e:
+                logger.debug(f"PyAV硬件解码不可用，使用软件解码: {str(e)}")
+        return av.open(video_path)
+
+    def isOpened(self):
+        return self.stream is not None
+
+    def grab(self):
+        """解码下一帧但不转换为numpy数组"""
+        if not self.isOpened():
+            return False
+        try:
+            if self._pending is not None:
+                self._frame, self._pending = self._pending, None
+            else:
+                self._frame = next(self._frames)
+            self._position += 1
+            return True
+        except (StopIteration, av.error.EOFError):
+            self._frame = None
+            return False
+        except Exception as e:
+            logger.error(f"PyAV解码失败: {str(e)}")
+            self._frame = None
+            return False
+
+    def retrieve(self, pixel_format='bgr24'):
+        """将最近一次grab()得到的帧转换为numpy数组，默认BGR格式"""
+        if self._frame is None:
+            return False, None
+        return True, self._frame.to_ndarray(format=pixel_format)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def read_rgb(self):
+        """读取下一帧，由FFmpeg在解码后直接转换为RGB格式"""
+        if not self.grab():
+            return False, None
+        return self.retrieve('rgb24')
+
+    def _frame_to_pts(self, frame_index):
+        """计算帧索引对应的显示时间戳"""
+        start = self.stream.start_time or 0
+        return start + int(frame_index / self.stream.average_rate / self.stream.time_base)
+
+    def _seek(self, frame_index):
+        """跳转到指定帧：先定位到之前最近的关键帧，再向前解码到目标帧"""
+        frame_index = max(0, int(frame_index))
+        target_pts = self._frame_to_pts(frame_index)
+        self.container.seek(target_pts, stream=self.stream, backward=True, any_frame=False)
+        self._frames = self.container.decode(self.stream)
+        self._frame = None
+        self._pending = None
+
+        if frame_index > 0:
+            for frame in self._frames:
+                if frame.pts is None or frame.pts >= target_pts:
+                    self._pending = frame
+                    break
+        self._position = frame_index
+        return True
+
+    def set(self, prop_id, value):
+        if not self.isOpened():
+            return False
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            try:
+                return self._seek(value)
+            except Exception as e:
+                logger.error(f"PyAV跳转失败: {str(e)}")
+                return False
+        return False
+
+    def get(self, prop_id):
+        if not self.isOpened():
+            return 0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.stream.codec_context.width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.stream.codec_context.height
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self._frame_count()
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self._position
+        return 0
+
+    def _frame_count(self):
+        """获取总帧数，容器中没有记录时根据时长估算"""
+        if self.stream.frames:
+            return self.stream.frames
+        fps = float(self.stream.average_rate or 0)
+        if self.stream.duration and self.stream.time_base:
+            return int(self.stream.duration * self.stream.time_base * fps)
+        if self.container.duration:
+            return int(self.container.duration / av.time_base * fps)
+        return 0
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+        self.container = None
+        self.stream = None
+        self._frames = None
+        self._frame = None
+        self._pending = None
+
+
+class NVDecCapture:
+    """
+    基于ffmpegcv的NVDEC硬件解码视频读取器
+
+    接口与cv2.VideoCapture保持一致。解码和缩放都在GPU上由FFmpeg完成，
+    输出RGB帧；可以通过set_output_size()让解码器直接输出检测所需的尺寸，
+    省去CPU上的缩放。get()返回的宽高始终是视频的原始尺寸。
+    只支持顺序读取，跳转只支持回到开头（重新打开）。
+    """
+
+    def __init__(self, video_path, output_size=None, gpu=0):
+        """
+        初始化视频读取器
+
+        Args:
+            video_path: 视频文件路径
+            output_size: 解码输出尺寸(width, height)，None表示原始尺寸
+            gpu: 使用的GPU编号
+        """
+        self.video_path = video_path
+        self.output_size = output_size
+        self.gpu = gpu
+        self.reader = None
+        self._frame = None
+        # 打开时试读的第一帧，由第一次grab()返回
+        self._pending = None
+        self._position = 0
+
+        try:
+            self.reader = self._open()
+        except Exception as e:
+            logger.error(f"NVDEC打开视频失败: {str(e)}")
+            self.release()
+
+    def _open(self):
+        """
+        打开解码器并试读第一帧
+
+        ffmpegcv在后台的FFmpeg进程中解码，没有可用的GPU或GPU不支持该编码时，
+        创建读取器本身不会失败，只有读取时才读不到数据，因此打开后立即试读一帧。
+
+        Returns:
+            读取器，第一帧保存在_pending中
+        """
+        reader = ffmpegcv.VideoCaptureNV(
+            self.video_path,
+            pix_fmt='rgb24',
+            resize=self.output_size,
+            resize_keepratio=False,
+            gpu=self.gpu
+        )
+        ret, frame = reader.read()
+        if not ret or frame is None:
+            reader.release()
+            raise RuntimeError('无法解码第一帧')
+        self._pending = frame
+        return reader
+
+    def set_output_size(self, output_size):
+        """
+        修改解码输出尺寸，只能在开始读取之前调用
+
+        Args:
+            output_size: 解码输出尺寸(width, height)
+
+        Returns:
+            bool: 是否修改成功
+        """
+        if not self.isOpened() or self._position != 0:
+            return False
+        try:
+            self.reader.release()
+            self.output_size = output_size
+            self.reader = self._open()
+            return True
+        except Exception as e:
+            logger.error(f"NVDEC设置输出尺寸失败: {str(e)}")
+            self.release()
+            return False
+
+    def isOpened(self):
+        return self.reader is not None
+
+    def grab(self):
+        """读取下一帧"""
+        if not self.isOpened():
+            return False
+        if self._pending is not None:
+            ret, frame = True, self._pending
+            self._pending = None
+        else:
+            ret, frame = self.reader.read()
+        self._frame = frame if ret else None
+        if not ret:
+            return False
+        self._position += 1
+        return True
+
+    def retrieve(self, pixel_format='bgr24'):
+        """返回最近一次grab()得到的帧，默认转换为BGR格式"""
+        if self._frame is None:
+            return False, None
+        if pixel_format == 'rgb24':
+            return True, self._frame
+        return True, cv2.cvtColor(self._frame, cv2.COLOR_RGB2BGR)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def read_rgb(self):
+        """读取下一帧，直接返回解码器输出的RGB帧"""
+        if not self.grab():
+            return False, None
+        return self.retrieve('rgb24')
+
+    def set(self, prop_id, value):
+        if not self.isOpened() or prop_id != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        if int(value) == self._position:
+            return True
+        if int(value) != 0:
+            logger.warning("NVDEC后端不支持跳转到指定帧")
+            return False
+        # 回到开头：重新打开解码器
+        try:
+            self.reader.release()
+            self.reader = self._open()
+            self._frame = None
+            self._position = 0
+            return True
+        except Exception as e:
+            logger.error(f"NVDEC重新打开视频失败: {str(e)}")
+            self.release()
+            return False
+
+    def get(self, prop_id):
+        if not self.isOpened():
+            return 0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.reader.origin_width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.reader.origin_height
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.reader.fps or 0)
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self.reader.count
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self._position
+        return 0
+
+    def release(self):
+        if self.reader is not None:
+            self.reader.release()
+        self.reader = None
+        self._frame = None
+        self._pending = None
+
+
+def read_rgb(capture, dst=None, scratch=None):
+    """
+    读取下一帧并返回RGB格式的图像
+
+    PyAV后端在解码时直接输出RGB，OpenCV后端则读取BGR后转换一次。
+
+    Args:
+        capture: 视频读取器
+        dst: 存放RGB结果的数组，尺寸不符时重新分配（仅OpenCV后端使用）
+        scratch: 存放BGR解码结果的临时数组，可在多次读取之间复用（仅OpenCV后端使用）
+
+    Returns:
+        tuple: (ret, rgb_frame)
+    """
+    if uses_native_rgb(capture):
+        return capture.read_rgb()
+
+    ret, frame = capture.read(scratch)
+    if not ret:
+        return False, None
+    return True, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst)
+
+
+def retrieve_rgb(capture, dst=None, scratch=None):
+    """
+    取出最近一次grab()得到的帧并返回RGB格式的图像
+
+    Args:
+        capture: 视频读取器
+        dst: 存放RGB结果的数组，尺寸不符时重新分配（仅OpenCV后端使用）
+        scratch: 存放BGR解码结果的临时数组，可在多次读取之间复用（仅OpenCV后端使用）
+
+    Returns:
+        tuple: (ret, rgb_frame)
+    """
+    if uses_native_rgb(capture):
+        return capture.retrieve('rgb24')
+
+    ret, frame = capture.retrieve(scratch)
+    if not ret:
+        return False, None
+    return True, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst)
+
+
+def uses_native_rgb(capture):
+    """视频读取器是否由解码器直接输出RGB帧（此时无法指定输出数组）"""
+    return isinstance(capture, (PyAVCapture, NVDecCapture))
+
+
+def open_opencv(video_path, hwaccel=True):
+    """
+    使用OpenCV的FFmpeg后端打开视频
+
+    硬件加速只能在打开时通过参数指定，OpenCV版本不支持（4.5.2之前）时按普通方式打开。
+
+    Args:
+        video_path: 视频文件路径
+        hwaccel: 是否请求任意可用的硬件解码（VAAPI、D3D11VA等），不可用时FFmpeg使用软件解码
+
+    Returns:
+        cv2.VideoCapture: 视频读取器
+    """
+    if hwaccel and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        capture = cv2.VideoCapture(
+            video_path, cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        )
+        if capture.isOpened():
+            accel = int(capture.get(cv2.CAP_PROP_HW_ACCELERATION))
+            if accel != cv2.VIDEO_ACCELERATION_NONE:
+                logger.info(f"OpenCV使用硬件解码（类型: {accel}）")
+            else:
+                logger.debug("OpenCV硬件解码不可用，使用软件解码")
+            return capture
+        capture.release()
+
+    capture = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+    if capture.isOpened():
+        return capture
+    # 未编译FFmpeg后端时由OpenCV自动选择
+    capture.release()
+    return cv2.VideoCapture(video_path)
+
+
+def open_video(video_path, backend=None):
+    """
+    按配置的解码后端打开视频
+
+    Args:
+        video_path: 视频文件路径
+        backend: 解码后端，'auto'、'pyav'、'nvdec'或'opencv'，None表示使用配置文件中的值
+
+    Returns:
+        与cv2.VideoCapture接口一致的视频读取器
+    """
+    backend = (backend or VIDEO_DECODE_BACKEND).lower()
+
+    if backend == 'nvdec':
+        if ffmpegcv is not None:
+            capture = NVDecCapture(video_path)
+            if capture.isOpened():
+                return capture
+            logger.warning(f"NVDEC无法解码视频（可能没有可用的GPU），回退到其他解码后端: {video_path}")
+        else:
+            logger.warning("未安装ffmpegcv，回退到其他解码后端")
+
+    # NVDEC不可用时与'auto'相同，优先使用PyAV
+    if backend in ('auto', 'pyav', 'nvdec'):
+        if av is not None:
+            capture = PyAVCapture(video_path, hwaccel=VIDEO_HWACCEL)
+            if capture.isOpened():
+                return capture
+            logger.warning(f"PyAV无法打开视频，回退到OpenCV: {video_path}")
+        elif backend == 'pyav':
+            logger.warning("未安装PyAV，回退到OpenCV解码")
+
+    return open_opencv(video_path, hwaccel=VIDEO_HWACCEL)
@@ -3,31 +3,76 @@
 """
 import os
 import cv2
+import bisect
 import time
 import queue
 import threading
+import numpy as np
 from datetime import timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-from config import logger, DETECTION_FREQUENCY
-from modules.utils import save_image, get_video_properties, format_time
+try:
+    from numba import njit
+except ImportError:  # numba为可选依赖，未安装时使用numpy计算
+    njit = None
+
+from config import (
+    logger, DETECTION_FREQUENCY, DETECTION_BATCH_SIZE, PIPELINE_QUEUE_SIZE,
+    DETECTION_TARGET_HEIGHT, FRAME_GRAB_SKIP, KEYFRAME_SEEK, SCAN_TRANSCODE, SCAN_TRANSCODE_MAX_SCALE
+)
+from modules.utils import (
+    save_image, get_video_properties, get_keyframe_indices, get_video_codec, transcode_for_scan, format_time
+)
+from modules.video_io import open_video, open_opencv, read_rgb, retrieve_rgb, uses_native_rgb, NVDecCapture
+from modules.bounded_deque import BoundedDeque
+from modules.buffer_pool import BufferPool
+from modules.lazy_frame import LazyFrame
+
+# 队列中的结束标记：解码线程结束后向写入线程放入一个，写入线程退出后再向保存线程放入一个
+_END_OF_STREAM = None
+
+
+def _rescale_locations_numpy(locations, scale_factor):
+    """将人脸位置数组(N, 4)按比例缩放，结果向零取整"""
+    return (locations * scale_factor).astype(np.int32)
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _rescale_locations(locations, scale_factor):
+        """将人脸位置数组(N, 4)按比例缩放，结果向零取整（numba编译）"""
+        out = np.empty_like(locations)
+        for i in range(locations.shape[0]):
+            for j in range(4):
+                out[i, j] = int(locations[i, j] * scale_factor)
+        return out
+else:
+    _rescale_locations = _rescale_locations_numpy
 
 
 class VideoProcessor:
     """视频处理器类，提供视频分析和人脸检测功能"""
     
-    def __init__(self, face_detector, detection_frequency=None, max_workers=4, frame_scale=0.5):
+    def __init__(self, face_detector, detection_frequency=None, max_workers=4, frame_scale=0.5, batch_size=None,
+                 context=None, result_notifier=None, backend=None, prefetch=None):
         """
         初始化视频处理器
         
         Args:
-            face_detector: 人脸检测器对象
+            face_detector: 人脸检测器对象，可以是多个任务共享的实例
             detection_frequency: 检测频率，每多少帧检测一次
             max_workers: 最大工作线程数
-            frame_scale: 图像缩放比例，用于加速处理
+            frame_scale: 图像缩放比例的上限，用于加速处理；加载视频时会根据分辨率进一步缩小
+            batch_size: 每批送入检测器的帧数
+            context: 本任务的匹配上下文（参考人脸和阈值），None表示使用检测器的默认上下文
+            result_notifier: 每追加一个检测结果时调用其notify()，用于通知进度推送
+            backend: 视频解码后端，'auto'、'pyav'、'nvdec'或'opencv'，None表示使用配置文件中的值
+            prefetch: 各阶段之间队列的最大长度（批次数），None表示使用配置文件中的值
         """
         self.face_detector = face_detector
+        self.context = context
         self.detection_frequency = detection_frequency or DETECTION_FREQUENCY
+        self.batch_size = max(1, batch_size or DETECTION_BATCH_SIZE)
         self.current_video_path = None
         self.video_capture = None
         self.frame_count = 0
@@ -35,19 +80,51 @@ class VideoProcessor:
         self.matched_frames = 0
         self.current_frame_index = 0
         self.video_fps = 0
+        # 用于跳转的关键帧索引，None表示逐帧grab()
+        self.keyframes = None
+        # 检测结果只由保存线程追加；_result_count为已发布的结果数，
+        # 读取方按该计数切片即可，无需加锁（GIL下整数赋值是原子的）
         self.detection_results = []
+        self._result_count = 0
+        self.result_notifier = result_notifier
         self.is_processing = False
         # 添加最小时间间隔属性（秒），避免短时间内重复记录同一人脸
         self.min_time_interval = 2.0
         # 上次检测到人脸的时间戳
         self.last_detection_timestamp = -self.min_time_interval
+        # 在此之前的帧都在上次记录结果的最小时间间隔内，结果必然被丢弃，解码线程直接跳过不检测
+        self.skip_until_frame = 0
         # 多线程相关
         self.max_workers = max_workers
-        self.frame_queue = queue.Queue(maxsize=100)  # 帧处理队列
-        self.result_queue = queue.Queue()  # 结果队列
-        self.workers = []
-        # 图像缩放比例
+        self.prefetch = max(1, prefetch or PIPELINE_QUEUE_SIZE)
+        # 已提交检测的批次（Future和批次），按提交顺序排列；长度上限即流水线中最多的批次数
+        self.pending_batches = BoundedDeque(maxsize=self.prefetch + max_workers)
+        # 截图保存队列：匹配帧已经按最小时间间隔去重，数量很少，不限制长度，
+        # 保证停止处理时已匹配的截图也能保存完
+        self.save_queue = BoundedDeque()
+        self.detector_pool = None
+        self.stop_event = None
+        # 加载视频（扫描转码）期间也能响应停止：stop_processing()设置，处理结束后清除
+        self._stop_requested = False
+        # 扫描转码的进度（0-1），不在转码时为None
+        self.transcode_progress = None
+        # 图像缩放比例：配置的上限和当前视频实际使用的比例
+        self.max_frame_scale = frame_scale
         self.frame_scale = frame_scale
+        # 检测线程还需要在CPU上缩放的比例；解码器已输出检测尺寸时为1.0
+        self.host_scale = frame_scale
+        # 检测尺寸的缩放缓冲区池，None表示不需要在CPU上缩放
+        self.resize_pool = None
+        # 解码线程使用的缩放函数，开始处理时按缩放比例生成
+        self._resize_for_detection = None
+        # 原始尺寸RGB帧的缓冲区池和解码线程复用的BGR临时数组（仅OpenCV后端使用）
+        self.frame_pool = None
+        self._bgr_scratch = None
+        # grab_frame(decode=True)完整读取的BGR帧，retrieve_frame()从这里转换
+        self._decoded_frame = None
+        # 实际解码的帧尺寸(width, height)，处理时按此创建缓冲区
+        self.decode_size = (0, 0)
+        self.backend = backend
         
     def load_video(self, video_path):
         """
@@ -67,44 +144,193 @@ class VideoProcessor:
             # 关闭之前的视频
             self.close_video()
             
-            # 获取视频属性
-            properties = get_video_properties(video_path)
-            if not properties:
-                return False
-                
             # 打开新视频
-            self.video_capture = cv2.VideoCapture(video_path)
+            self.video_capture = open_video(video_path, backend=self.backend)
             if not self.video_capture.isOpened():
                 logger.error(f"无法打开视频: {video_path}")
                 return False
                 
+            # 从已打开的视频读取属性，避免重复打开解码器
+            properties = get_video_properties(video_path, capture=self.video_capture)
+            if not properties:
+                self.close_video()
+                return False
+                
             self.current_video_path = video_path
             self.frame_count = properties['frame_count']
             self.video_fps = properties['fps']
+            self.frame_scale = self.get_detect_scale(properties['height'])
+            self.host_scale = self.frame_scale
+            # 实际解码的文件和帧尺寸（使用扫描转码时与原视频不同）
+            decode_path = video_path
+            decode_size = (properties['width'], properties['height'])
+            if self.frame_scale != 1.0 and isinstance(self.video_capture, NVDecCapture):
+                # NVDEC在GPU上直接缩放到检测尺寸（NV12要求宽高为偶数）
+                output_size = (
+                    int(properties['width'] * self.frame_scale) // 2 * 2,
+                    int(properties['height'] * self.frame_scale) // 2 * 2
+                )
+                if self.video_capture.set_output_size(output_size):
+                    self.host_scale = 1.0
+                elif not self.video_capture.isOpened():
+                    self.close_video()
+                    return False
+            elif SCAN_TRANSCODE and self.frame_scale <= SCAN_TRANSCODE_MAX_SCALE:
+                output_size = (
+                    int(properties['width'] * self.frame_scale) // 2 * 2,
+                    int(properties['height'] * self.frame_scale) // 2 * 2
+                )
+                proxy_path = self._open_scan_proxy(video_path, output_size)
+                if proxy_path:
+                    decode_path = proxy_path
+                    decode_size = output_size
+            self.decode_size = decode_size
+            self.keyframes = self._load_keyframes(decode_path)
             self.current_frame_index = 0
             self.processed_frames = 0
             self.matched_frames = 0
+            self._result_count = 0
             self.detection_results = []
             # 重置最后检测时间戳
             self.last_detection_timestamp = -self.min_time_interval
+            self.skip_until_frame = 0
             
-            logger.info(f"成功加载视频: {video_path}, 总帧数: {self.frame_count}, FPS: {self.video_fps}")
+            logger.info(f"成功加载视频: {video_path}, 总帧数: {self.frame_count}, FPS: {self.video_fps}, "
+                        f"检测缩放比例: {self.frame_scale:.3f}, 检测设备: {self.face_detector.device}")
             return True
         except Exception as e:
             logger.error(f"加载视频失败: {str(e)}")
             return False
     
+    def _open_scan_proxy(self, video_path, output_size):
+        """
+        对H.264/H.265视频使用检测尺寸的MJPEG转码结果代替原视频解码
+        
+        转码后的帧已经是检测尺寸，检测线程不再缩放，截图也保存为该尺寸。
+        帧数和时间戳与原视频一致，进度和时间计算仍使用原视频的属性。
+        
+        Args:
+            video_path: 原视频路径
+            output_size: 转码尺寸(width, height)
+            
+        Returns:
+            str: 转码后的视频路径，不使用转码时返回None
+        """
+        codec = get_video_codec(video_path)
+        if codec not in ('h264', 'hevc'):
+            return None
+        
+        def on_progress(progress):
+            self.transcode_progress = progress
+            if self.result_notifier is not None:
+                self.result_notifier.notify()
+        
+        self.transcode_progress = 0.0
+        try:
+            proxy_path = transcode_for_scan(
+                video_path, *output_size,
+                frame_count=self.frame_count,
+                should_stop=lambda: self._stop_requested,
+                progress_callback=on_progress
+            )
+        finally:
+            self.transcode_progress = None
+        if not proxy_path:
+            return None
+        
+        capture = open_opencv(proxy_path, hwaccel=False)
+        if not capture.isOpened():
+            logger.warning(f"无法打开扫描转码结果，使用原视频: {proxy_path}")
+            capture.release()
+            return None
+        
+        self.video_capture.release()
+        self.video_capture = capture
+        self.host_scale = 1.0
+        return proxy_path
+    
+    def _load_keyframes(self, video_path):
+        """
+        获取用于跳转的关键帧索引
+        
+        只有平均关键帧间隔小于检测间隔时跳转才有意义；否则大多数采样帧与上一个采样帧
+        位于同一个GOP中，跳转后仍要从关键帧解码过来，不如继续逐帧grab()。
+        
+        Args:
+            video_path: 视频文件路径
+            
+        Returns:
+            list: 关键帧索引列表，不使用跳转时返回None
+        """
+        if not KEYFRAME_SEEK or not FRAME_GRAB_SKIP or isinstance(self.video_capture, NVDecCapture):
+            return None
+        
+        keyframes = get_keyframe_indices(video_path, self.video_fps)
+        if not keyframes or len(keyframes) < 2:
+            return None
+        
+        average_gop = (keyframes[-1] - keyframes[0]) / (len(keyframes) - 1)
+        if average_gop >= self.detection_frequency:
+            logger.debug(f"平均关键帧间隔({average_gop:.1f})不小于检测间隔，逐帧读取")
+            return None
+        
+        logger.info(f"使用关键帧跳转，关键帧数: {len(keyframes)}, 平均间隔: {average_gop:.1f}")
+        return keyframes
+    
+    def _seek_to_keyframe(self):
+        """
+        如果下一个采样帧之前有比当前位置更靠后的关键帧，直接跳转到该关键帧，
+        之后再逐帧grab()到采样帧
+        """
+        position = self.current_frame_index
+        # 下一个需要检测的帧（跳过最小时间间隔内的帧）
+        first_candidate = max(position, self.skip_until_frame)
+        target = -(-first_candidate // self.detection_frequency) * self.detection_frequency
+        i = bisect.bisect_right(self.keyframes, target) - 1
+        if i < 0 or self.keyframes[i] <= position:
+            return
+        
+        keyframe = self.keyframes[i]
+        if self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, keyframe):
+            self.current_frame_index = keyframe
+        else:
+            # 当前后端不支持跳转，之后都逐帧读取
+            logger.warning("视频跳转失败，改为逐帧读取")
+            self.keyframes = None
+    
+    def get_detect_scale(self, height):
+        """
+        根据视频高度计算检测时使用的缩放比例
+        
+        检测器只需要足够大的人脸，高分辨率视频按DETECTION_TARGET_HEIGHT缩小即可，
+        检测开销随分辨率平方下降；同时不超过配置的缩放比例上限。
+        
+        Args:
+            height: 视频高度（像素）
+            
+        Returns:
+            float: 缩放比例
+        """
+        if DETECTION_TARGET_HEIGHT <= 0 or height <= 0:
+            return self.max_frame_scale
+        return min(self.max_frame_scale, 1.0, DETECTION_TARGET_HEIGHT / height)
+    
     def close_video(self):
         """关闭当前视频"""
+        self._release_buffers()
         if self.video_capture and self.video_capture.isOpened():
             self.video_capture.release()
             self.video_capture = None
             self.current_video_path = None
     
-    def read_frame(self):
+    def read_frame(self, rgb=False, dst=None):
         """
         读取下一帧
         
+        Args:
+            rgb: 是否返回RGB格式的帧（默认为OpenCV的BGR格式）
+            dst: 存放RGB帧的数组，None表示新分配
+        
         Returns:
             tuple: (frame, frame_index, timestamp)
         """
@@ -113,7 +339,10 @@ class VideoProcessor:
             return None, -1, 0
             
         # 读取帧
-        ret, frame = self.video_capture.read()
+        if rgb:
+            ret, frame = read_rgb(self.video_capture, dst=dst, scratch=self._bgr_scratch)
+        else:
+            ret, frame = self.video_capture.read()
         
         if not ret:
             return None, -1, 0
@@ -121,90 +350,512 @@ class VideoProcessor:
         frame_index = self.current_frame_index
         self.current_frame_index += 1
         
-        # 计算时间戳（秒）
-        timestamp = frame_index / self.video_fps if self.video_fps > 0 else 0
+        return frame, frame_index, self._frame_timestamp(frame_index)
+    
+    def grab_frame(self, decode=False):
+        """
+        前进到下一帧但不做像素转换，需要图像时再调用retrieve_frame()
         
-        return frame, frame_index, timestamp
+        Args:
+            decode: 是否完整读取该帧而不使用grab()：OpenCV后端把BGR帧读入复用的临时数组，
+                不转换RGB；PyAV和NVDEC后端的grab()本身就会完整解码，不受影响
+        
+        Returns:
+            tuple: (frame_index, timestamp)，视频结束或读取失败时为(-1, 0)
+        """
+        if not self.video_capture or not self.video_capture.isOpened():
+            logger.error("读取帧失败: 未加载视频")
+            return -1, 0
+        
+        self._decoded_frame = None
+        if decode and not uses_native_rgb(self.video_capture):
+            ret, self._decoded_frame = self.video_capture.read(self._bgr_scratch)
+        else:
+            ret = self.video_capture.grab()
+        if not ret:
+            self._decoded_frame = None
+            return -1, 0
+        
+        frame_index = self.current_frame_index
+        self.current_frame_index += 1
+        
+        return frame_index, self._frame_timestamp(frame_index)
     
-    def process_frame_worker(self, stop_event):
+    def retrieve_frame(self, rgb=False, dst=None):
         """
-        处理队列中的帧的工作线程
+        取出最近一次grab_frame()得到的帧
         
         Args:
-            stop_event: 停止事件
+            rgb: 是否返回RGB格式的帧（默认为OpenCV的BGR格式）
+            dst: 存放RGB帧的数组，None表示新分配
+        
+        Returns:
+            numpy.ndarray: 帧图像，失败时返回None
+        """
+        if self._decoded_frame is not None:
+            # 已完整读取的BGR帧位于复用的临时数组中，始终返回转换或复制后的新数组
+            if rgb:
+                return cv2.cvtColor(self._decoded_frame, cv2.COLOR_BGR2RGB, dst=dst)
+            return self._decoded_frame.copy()
+        if rgb:
+            ret, frame = retrieve_rgb(self.video_capture, dst=dst, scratch=self._bgr_scratch)
+        else:
+            ret, frame = self.video_capture.retrieve()
+        return frame if ret else None
+    
+    def _frame_timestamp(self, frame_index):
+        """计算帧的时间戳（秒）"""
+        return frame_index / self.video_fps if self.video_fps > 0 else 0
+    
+    def _create_resize_pool(self, width, height):
+        """
+        创建检测尺寸的缩放缓冲区池
+        
+        同时存在的缩放帧最多为待写入队列中的批次和解码线程正在攒（或等待放入队列）的批次。
+        
+        Args:
+            width: 视频宽度
+            height: 视频高度
+            
+        Returns:
+            BufferPool: 缓冲区池，不需要缩放时返回None
+        """
+        if self.host_scale == 1.0:
+            return None
+        shape = (int(height * self.host_scale), int(width * self.host_scale), 3)
+        return BufferPool(shape, max_buffers=(self.prefetch + self.max_workers + 1) * self.batch_size)
+    
+    def _create_frame_buffers(self, width, height):
+        """
+        为OpenCV后端创建原始尺寸RGB帧的缓冲区池和BGR临时数组
+        
+        OpenCV解码出BGR后需要转换一次RGB：BGR结果只在解码线程中短暂使用，复用同一个数组；
+        RGB帧要一直保留到写入线程（或保存线程）处理完，从缓冲区池中取用并在之后放回。
+        PyAV和NVDEC后端由解码器直接输出RGB，不使用这些缓冲区。
+        
+        Args:
+            width: 视频宽度
+            height: 视频高度
+        """
+        self.frame_pool = None
+        self._bgr_scratch = None
+        if uses_native_rgb(self.video_capture) or width <= 0 or height <= 0:
+            return
+        shape = (height, width, 3)
+        self._bgr_scratch = np.empty(shape, dtype=np.uint8)
+        # 同时存在的帧最多为待写入队列中的批次、写入线程正在处理的批次和解码线程正在攒的批次
+        self.frame_pool = BufferPool(shape, max_buffers=(self.prefetch + self.max_workers + 2) * self.batch_size)
+    
+    def _acquire_frame(self):
+        """从缓冲区池中取出存放RGB帧的数组，没有缓冲区池时返回None"""
+        return self.frame_pool.acquire() if self.frame_pool is not None else None
+    
+    def _release_frame(self, frame):
+        """原始帧不再使用时放回缓冲区池"""
+        if self.frame_pool is not None:
+            self.frame_pool.release(frame)
+    
+    def _release_buffers(self):
+        """
+        释放处理期间使用的缓冲区
+        
+        处理器在任务完成后还会保留在任务列表中，缓冲区只在处理期间存在，
+        避免已完成的任务长期占用大量内存。
+        """
+        self.resize_pool = None
+        self._resize_for_detection = None
+        self.frame_pool = None
+        self._bgr_scratch = None
+        self._decoded_frame = None
+    
+    def _release_batch(self, batch):
+        """
+        放回未被检测的批次占用的缓冲区
+        
+        Args:
+            batch: 解码线程生成的批次，元素为(缩放帧, 原始帧, 帧索引, 时间戳)
+        """
+        for small, frame, _, _ in batch:
+            if small is not frame and self.resize_pool is not None:
+                self.resize_pool.release(small)
+            self._release_frame(frame)
+    
+    def _release_pending(self, future, batch):
+        """
+        放回已提交但不再交给写入线程处理的批次占用的缓冲区
+        
+        尚未开始检测的批次取消后直接放回；正在检测的批次等待检测结束后放回结果中的原始帧。
+        
+        Args:
+            future: 提交检测返回的Future
+            batch: 提交的批次
+        """
+        if future.cancel():
+            self._release_batch(batch)
+            return
+        for result in future.result():
+            self._release_frame(result['frame'])
+    
+    def _drain_pending_batches(self):
+        """处理结束后，放回待写入队列中剩余批次的缓冲区"""
+        while True:
+            try:
+                item = self.pending_batches.get(timeout=0)
+            except queue.Empty:
+                return
+            if item is not _END_OF_STREAM:
+                self._release_pending(*item)
+    
+    def _build_resizer(self, width, height):
+        """
+        按当前视频的缩放比例生成解码线程使用的缩放函数
+        
+        缩放比例和检测尺寸在处理期间不再变化，这里把它们和缓冲区池固定在闭包中，
+        解码循环不再逐帧判断是否需要缩放、计算尺寸和查找缓冲区池。
+        缩小时使用区域插值，结果写入缓冲区池中复用的数组。
+        
+        Args:
+            width: 实际解码的帧宽度
+            height: 实际解码的帧高度
+            
+        Returns:
+            callable: 接收原始帧、返回检测尺寸帧的函数，无需缩放时原样返回
+        """
+        scale = self.host_scale
+        if scale == 1.0:
+            return lambda frame: frame
+        
+        interpolation = cv2.INTER_AREA
+        acquire = self.resize_pool.acquire if self.resize_pool is not None else lambda: None
+        if width <= 0 or height <= 0:
+            # 视频属性中没有尺寸时按每帧的实际尺寸计算
+            def resize(frame):
+                h, w = frame.shape[:2]
+                return cv2.resize(frame, (int(w * scale), int(h * scale)), dst=acquire(), interpolation=interpolation)
+            return resize
+        
+        size = (int(width * scale), int(height * scale))
+        
+        def resize(frame):
+            # 尺寸与dst不一致时OpenCV会重新分配，因此始终使用返回值
+            return cv2.resize(frame, size, dst=acquire(), interpolation=interpolation)
+        return resize
+    
+    def _put(self, target_queue, item, stop_event):
+        """
+        向有界队列放入数据，队列满时阻塞等待，收到停止信号后放弃
+        
+        Returns:
+            bool: 是否成功放入
         """
         while not stop_event.is_set():
             try:
-                # 获取一帧数据，最多等待1秒
-                item = self.frame_queue.get(timeout=1)
-                frame, frame_index, timestamp = item
+                target_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def decode_worker(self, stop_event):
+        """
+        解码线程：读取视频帧，把符合检测频率的帧按批次提交给检测线程池
+        
+        帧在这里一次性转换为RGB格式并缩放到检测尺寸，后续检测、标记和保存截图都直接使用RGB帧。
+        不需要检测的帧不做像素转换：启用FRAME_GRAB_SKIP时只调用grab()跳过，
+        关键帧间隔较短时还会直接跳转到采样帧之前最近的关键帧；
+        否则每帧都完整读取，但同样只把需要检测的帧转换为RGB。结束时向写入线程放入结束标记。
+        
+        Args:
+            stop_event: 停止事件
+        """
+        batch = []
+        resize_for_detection = self._resize_for_detection
+        try:
+            while self.is_processing and not stop_event.is_set():
+                if FRAME_GRAB_SKIP and self.keyframes:
+                    self._seek_to_keyframe()
+                
+                # 个别编码无法可靠grab()时（关闭FRAME_GRAB_SKIP）逐帧完整读取
+                frame_index, timestamp = self.grab_frame(decode=not FRAME_GRAB_SKIP)
+                if frame_index < 0:
+                    # 视频结束
+                    break
                 
-                # 调整图像大小，加速处理
-                if self.frame_scale != 1.0:
-                    h, w = frame.shape[:2]
-                    resized_frame = cv2.resize(frame, (int(w * self.frame_scale), int(h * self.frame_scale)))
-                else:
-                    resized_frame = frame
+                # 不符合检测频率或在最小时间间隔内的帧直接跳过
+                if frame_index % self.detection_frequency != 0 or frame_index < self.skip_until_frame:
+                    continue
                 
-                # 处理帧
-                processed_frame, matches, has_matches = self.face_detector.process_frame(resized_frame)
+                dst = self._acquire_frame()
+                frame = self.retrieve_frame(rgb=True, dst=dst)
+                if frame is None:
+                    self._release_frame(dst)
+                    break
                 
-                # 如果有匹配结果并且是在缩放图像上检测的，将匹配结果映射回原始图像
-                if has_matches and self.frame_scale != 1.0:
-                    scale_factor = 1.0 / self.frame_scale
-                    # 在原始图像上重新标记匹配结果
-                    adjusted_matches = []
-                    for match in matches:
-                        if isinstance(match, dict) and 'location' in match:
-                            top, right, bottom, left = match['location']
-                            adjusted_location = (
-                                int(top * scale_factor),
-                                int(right * scale_factor),
-                                int(bottom * scale_factor),
-                                int(left * scale_factor)
-                            )
-                            adjusted_match = match.copy()
-                            adjusted_match['location'] = adjusted_location
-                            adjusted_matches.append(adjusted_match)
-                    
-                    # 在原始图像上重新绘制标记
-                    processed_frame = self.face_detector.draw_face_rectangles(frame, adjusted_matches)
-                elif has_matches and self.frame_scale == 1.0:
-                    # 保持原始大小的处理结果
-                    processed_frame = frame.copy()
-                    processed_frame = self.face_detector.draw_face_rectangles(processed_frame, matches)
-                else:
-                    # 没有匹配，使用原始帧
-                    processed_frame = frame.copy()
+                # 在解码线程中缩放一次，检测线程只处理缩放后的图像。
+                # 帧的所有权随批次交给后续阶段，不需要复制：OpenCV后端的帧来自frame_pool，
+                # 由写入线程（或保存线程）用完后放回，放回前解码线程不会再写入该数组；
+                # PyAV和NVDEC后端每次返回新分配的数组。缩放帧同样来自resize_pool，检测完成后放回
+                small = resize_for_detection(frame)
                 
-                # 放入结果队列
-                result = {
+                # 攒够一批后提交检测，原始帧留给写入线程标记和保存截图
+                batch.append((small, frame, frame_index, timestamp))
+                self.processed_frames += 1
+                if len(batch) >= self.batch_size:
+                    # 提交后批次的缓冲区由_submit_batch和写入线程负责放回
+                    submitted = self._submit_batch(batch, stop_event)
+                    batch = []
+                    if not submitted:
+                        return
+            
+            # 送出不足一批的剩余帧
+            if batch:
+                self._submit_batch(batch, stop_event)
+                batch = []
+        except Exception as e:
+            logger.error(f"解码视频帧异常: {str(e)}")
+        finally:
+            # 出错时未提交的批次不会再被检测，直接放回缓冲区
+            self._release_batch(batch)
+            self._put(self.pending_batches, _END_OF_STREAM, stop_event)
+    
+    def _submit_batch(self, batch, stop_event):
+        """
+        把一批帧提交给检测线程池，并按提交顺序放入待写入队列
+        
+        待写入队列已满时阻塞，解码线程最多领先写入线程队列长度个批次。
+        停止处理时放弃该批次并放回其占用的缓冲区。
+        
+        Returns:
+            bool: 是否成功提交
+        """
+        future = self.detector_pool.submit(self.detect_batch, batch)
+        if self._put(self.pending_batches, (future, batch), stop_event):
+            return True
+        self._release_pending(future, batch)
+        return False
+    
+    def detect_batch(self, batch):
+        """
+        在检测线程池中执行：检测一批帧中匹配的人脸
+        
+        Args:
+            batch: 解码线程提交的批次，元素为(缩放帧, 原始帧, 帧索引, 时间戳)
+            
+        Returns:
+            list: 各帧的检测结果，出错时为空列表
+        """
+        results = []
+        try:
+            # 批次提交后写入线程可能已记录了新的匹配：落在最小时间间隔内的帧即使匹配也会被丢弃，
+            # 不再检测（已放入流水线的批次同样受益，不只是解码线程之后读取的帧）
+            skip_until_frame = self.skip_until_frame
+            detect_items = [item for item in batch if item[2] >= skip_until_frame]
+            
+            # 整批检测匹配的人脸
+            matches_by_index = {}
+            if detect_items:
+                small_frames = [small for small, _, _, _ in detect_items]
+                matches_list = self.face_detector.match_faces_batch(small_frames, self.context, rgb=True)
+                for (_, _, frame_index, _), matches in zip(detect_items, matches_list):
+                    matches_by_index[frame_index] = matches
+            
+            # 跳过的帧也生成结果，由写入线程调用回调并放回缓冲区；
+            # 标记人脸推迟到写入线程，只对有匹配的帧进行
+            for _, frame, frame_index, timestamp in batch:
+                matches = matches_by_index.get(frame_index, [])
+                results.append({
                     'frame_index': frame_index,
                     'timestamp': timestamp,
-                    'has_matches': has_matches,
+                    'has_matches': bool(matches),
                     'matches': matches,
-                    'processed_frame': processed_frame
-                }
-                self.result_queue.put(result)
-                
-                # 标记任务完成
-                self.frame_queue.task_done()
-                
+                    'frame': frame
+                })
+        except Exception as e:
+            logger.error(f"处理帧异常: {str(e)}")
+            # 出错的批次没有检测结果，原始帧直接放回缓冲区池
+            results = []
+            for _, frame, _, _ in batch:
+                self._release_frame(frame)
+        finally:
+            # 检测完成后缩放帧不再使用，放回缓冲区池
+            if self.resize_pool is not None:
+                for small, frame, _, _ in batch:
+                    if small is not frame:
+                        self.resize_pool.release(small)
+        return results
+    
+    def _draw_matches(self, frame, matches):
+        """
+        将缩放图像上的匹配结果映射回原始图像并直接在原始图像上标记
+        
+        Args:
+            frame: 原始视频帧，会被直接修改（原始帧保存截图后即放回缓冲区池或丢弃，无需复制）
+            matches: 在缩放图像上得到的匹配结果
+            
+        Returns:
+            numpy.ndarray: 标记后的原始帧
+        """
+        # 个别解码后端返回只读数组（如直接包装管道读取的数据），只在需要标记时才复制
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        
+        # 解码器已输出检测尺寸时，帧本身就是检测图像，截图也保存为该尺寸
+        if self.host_scale == 1.0:
+            return self.face_detector.draw_face_rectangles_inplace(frame, matches)
+        
+        located = [match for match in matches if isinstance(match, dict) and 'location' in match]
+        if not located:
+            return frame
+        
+        # 所有位置一次性缩放回原始尺寸
+        locations = np.array([match['location'] for match in located], dtype=np.int32)
+        scaled = _rescale_locations(locations, 1.0 / self.host_scale).tolist()
+        
+        adjusted_matches = []
+        for match, location in zip(located, scaled):
+            adjusted_match = match.copy()
+            adjusted_match['location'] = tuple(location)
+            adjusted_matches.append(adjusted_match)
+        
+        return self.face_detector.draw_face_rectangles_inplace(frame, adjusted_matches)
+    
+    def writer_worker(self, stop_event, callback=None):
+        """
+        写入线程：按帧顺序处理检测结果，保存截图并调用回调函数
+        
+        待写入队列中的批次按提交顺序排列，依次等待最早的批次检测完成，
+        不需要重新排序，最小时间间隔的去重逻辑与顺序处理时一致。收到结束标记后退出。
+        
+        Args:
+            stop_event: 停止事件
+            callback: 回调函数，用于更新进度等
+        """
+        while not stop_event.is_set():
+            try:
+                item = self.pending_batches.get(timeout=1)
             except queue.Empty:
-                # 队列为空，继续下一次循环
                 continue
+            
+            if item is _END_OF_STREAM:
+                return
+            
+            # 等待该批次检测完成，期间响应停止信号
+            future, batch = item
+            results = None
+            while results is None and not stop_event.is_set():
+                try:
+                    results = future.result(timeout=1)
+                except FutureTimeoutError:
+                    continue
+            if results is None:
+                # 停止处理时该批次不再处理
+                self._release_pending(future, batch)
+                return
+            
+            for result in results:
+                try:
+                    self._handle_result(result, callback)
+                except Exception as e:
+                    # 单帧出错不影响后续帧，该帧直接放回缓冲区池
+                    logger.error(f"写入检测结果异常: {str(e)}")
+                    self._release_frame(result['frame'])
+    
+    def save_worker(self):
+        """
+        保存线程：编码并写入截图，然后发布检测结果
+        
+        检测结果只由这个线程追加，发布计数的方式与之前相同，读取方无需加锁。
+        收到结束标记后退出。
+        """
+        while True:
+            item = self.save_queue.get()
+            if item is _END_OF_STREAM:
+                return
+            
+            frame, prefix, result = item
+            try:
+                result['screenshot_path'] = save_image(frame, prefix=prefix, rgb=True)
+                
+                # 记录检测结果
+                self.detection_results.append(result)
+                self._result_count += 1
+                if self.result_notifier is not None:
+                    self.result_notifier.notify()
+                
+                logger.info(f"检测到匹配人脸 - 帧: {result['frame_index']}, 时间: {result['formatted_time']}, "
+                            f"匹配数: {result['matches_count']}")
             except Exception as e:
-                logger.error(f"处理帧异常: {str(e)}")
-                # 标记任务完成，避免阻塞
-                if not self.frame_queue.empty():
-                    self.frame_queue.task_done()
+                logger.error(f"保存截图异常: {str(e)}")
+            finally:
+                self._release_frame(frame)
+    
+    def _handle_result(self, result, callback=None):
+        """
+        处理单帧的检测结果：去重、提交截图保存并调用回调函数
+        
+        Args:
+            result: 检测线程生成的单帧结果
+            callback: 回调函数，用于更新进度等
+        """
+        frame_index = result['frame_index']
+        timestamp = result['timestamp']
+        matches = result['matches']
+        frame = result['frame']
+        
+        # 如果检测到匹配的人脸，并且与上次检测时间间隔足够
+        detection = None
+        if result['has_matches'] and (timestamp - self.last_detection_timestamp >= self.min_time_interval):
+            self.matched_frames += 1
+            self.last_detection_timestamp = timestamp
+            # 通知解码线程跳过最小时间间隔内的帧（已经在流水线中的帧仍由上面的判断丢弃）
+            if self.video_fps > 0:
+                self.skip_until_frame = max(
+                    self.skip_until_frame,
+                    int((timestamp + self.min_time_interval) * self.video_fps)
+                )
+            
+            # 检测结果，截图路径由保存线程填写
+            detection = {
+                'frame_index': frame_index,
+                'timestamp': timestamp,
+                'formatted_time': format_time(timestamp),
+                'screenshot_path': None,
+                'matches_count': len(matches)
+            }
+        
+        # 要保存截图的帧立即标记；最小时间间隔内的匹配帧只可能用作预览，
+        # 标记推迟到回调真正读取像素时，回调丢弃的帧不做任何处理
+        processed_frame = frame
+        if detection is not None:
+            processed_frame = self._draw_matches(frame, matches)
+        elif result['has_matches']:
+            processed_frame = LazyFrame(frame, [(self._draw_matches, (matches,))])
+        
+        # 调用回调函数
+        if callback and self.is_processing:
+            progress = frame_index / self.frame_count if self.frame_count > 0 else 0
+            should_continue = callback(frame_index, self.frame_count, progress, processed_frame)
+            if should_continue is False:
+                logger.info("用户取消处理")
+                self.stop_processing()
+        
+        # 回调用完当前帧后，截图的编码和写盘交给保存线程，不阻塞写入线程；
+        # 保存线程写完后会把帧放回缓冲区池，不需要保存的帧在这里直接放回
+        if detection is not None:
+            self.save_queue.put((processed_frame, "detected", detection))
+        else:
+            self._release_frame(frame)
     
     def process_video(self, callback=None):
         """
         处理整个视频，检测匹配的人脸
         
+        解码、写入和截图保存分别在独立线程中运行，检测由线程池执行，
+        解码线程提交的批次按顺序交给写入线程，使解码和磁盘写入与人脸检测重叠执行。
+        
         Args:
-            callback: 回调函数，用于更新进度等
+            callback: 回调函数，用于更新进度等，收到的当前帧为RGB格式，
+                可能是LazyFrame，需要像素时用as_array()读取
             
         Returns:
             list: 检测结果列表
@@ -216,9 +867,16 @@ class VideoProcessor:
         if not self.face_detector:
             logger.error("处理视频失败: 未配置人脸检测器")
             return []
+        
+        if self._stop_requested:
+            # 加载视频期间已被停止
+            self._stop_requested = False
+            logger.info("视频处理已停止")
+            return []
             
         try:
             self.is_processing = True
+            self._result_count = 0
             self.detection_results = []
             self.processed_frames = 0
             self.matched_frames = 0
@@ -228,123 +886,42 @@ class VideoProcessor:
             # 重置到第一帧
             self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
             self.current_frame_index = 0
+            self.last_detection_timestamp = -self.min_time_interval
+            self.skip_until_frame = 0
             
-            # 创建停止事件
-            stop_event = threading.Event()
+            # 缓冲区只在处理期间存在，结束后释放
+            self.resize_pool = self._create_resize_pool(*self.decode_size)
+            self._create_frame_buffers(*self.decode_size)
+            self._resize_for_detection = self._build_resizer(*self.decode_size)
             
-            # 创建并启动工作线程
-            self.workers = []
-            for _ in range(self.max_workers):
-                worker = threading.Thread(
-                    target=self.process_frame_worker,
-                    args=(stop_event,)
-                )
-                worker.daemon = True
-                worker.start()
-                self.workers.append(worker)
+            # 创建停止事件、待写入队列和检测线程池
+            stop_event = threading.Event()
+            self.stop_event = stop_event
+            self.pending_batches = BoundedDeque(maxsize=self.prefetch + self.max_workers)
+            self.detector_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='detector')
             
             start_time = time.time()
             
-            # 读取和分发帧
-            while self.is_processing:
-                # 读取帧
-                frame, frame_index, timestamp = self.read_frame()
-                
-                if frame is None:
-                    # 视频结束
-                    break
-                    
-                # 计算进度
-                progress = frame_index / self.frame_count if self.frame_count > 0 else 0
-                
-                # 只处理符合检测频率的帧
-                if frame_index % self.detection_frequency == 0:
-                    # 将帧放入队列处理
-                    self.frame_queue.put((frame.copy(), frame_index, timestamp))
-                    self.processed_frames += 1
-                
-                # 处理结果队列中的结果
-                while not self.result_queue.empty():
-                    result = self.result_queue.get()
-                    frame_index = result['frame_index']
-                    timestamp = result['timestamp']
-                    has_matches = result['has_matches']
-                    matches = result['matches']
-                    processed_frame = result['processed_frame']
-                    
-                    # 如果检测到匹配的人脸，并且与上次检测时间间隔足够
-                    if has_matches and (timestamp - self.last_detection_timestamp >= self.min_time_interval):
-                        self.matched_frames += 1
-                        self.last_detection_timestamp = timestamp
-                        
-                        # 格式化时间戳
-                        formatted_time = format_time(timestamp)
-                        
-                        # 保存截图
-                        screenshot_path = save_image(processed_frame, prefix="detected")
-                        
-                        # 记录检测结果
-                        result = {
-                            'frame_index': frame_index,
-                            'timestamp': timestamp,
-                            'formatted_time': formatted_time,
-                            'screenshot_path': screenshot_path,
-                            'matches_count': len(matches)
-                        }
-                        
-                        self.detection_results.append(result)
-                        
-                        logger.info(f"检测到匹配人脸 - 帧: {frame_index}, 时间: {formatted_time}, 匹配数: {len(matches)}")
-                
-                # 调用回调函数
-                if callback:
-                    # 传递当前处理帧或最近的匹配帧
-                    current_display_frame = processed_frame if 'processed_frame' in locals() else frame
-                    should_continue = callback(frame_index, self.frame_count, progress, current_display_frame)
-                    if should_continue is False:
-                        self.is_processing = False
-                        logger.info("用户取消处理")
-                        break
-            
-            # 等待所有队列中的帧处理完成
-            self.frame_queue.join()
-            
-            # 处理剩余的结果队列
-            while not self.result_queue.empty():
-                result = self.result_queue.get()
-                frame_index = result['frame_index']
-                timestamp = result['timestamp']
-                has_matches = result['has_matches']
-                matches = result['matches']
-                processed_frame = result['processed_frame']
-                
-                if has_matches and (timestamp - self.last_detection_timestamp >= self.min_time_interval):
-                    self.matched_frames += 1
-                    self.last_detection_timestamp = timestamp
-                    
-                    # 格式化时间戳
-                    formatted_time = format_time(timestamp)
-                    
-                    # 保存截图
-                    screenshot_path = save_image(processed_frame, prefix="detected")
-                    
-                    # 记录检测结果
-                    result = {
-                        'frame_index': frame_index,
-                        'timestamp': timestamp,
-                        'formatted_time': formatted_time,
-                        'screenshot_path': screenshot_path,
-                        'matches_count': len(matches)
-                    }
-                    
-                    self.detection_results.append(result)
-            
-            # 发送停止信号给所有工作线程
-            stop_event.set()
+            # 创建并启动解码、写入和保存线程
+            decoder = threading.Thread(target=self.decode_worker, args=(stop_event,))
+            writer = threading.Thread(target=self.writer_worker, args=(stop_event, callback))
+            self.save_queue = BoundedDeque()
+            saver = threading.Thread(target=self.save_worker)
+            
+            for thread in [decoder, writer, saver]:
+                thread.daemon = True
+                thread.start()
+            
+            # 写入线程收到结束标记后退出（用户停止时写入线程直接退出）
+            writer.join()
             
-            # 等待所有工作线程结束
-            for worker in self.workers:
-                worker.join(timeout=1.0)
+            # 等待已提交的截图全部保存
+            self.save_queue.put(_END_OF_STREAM)
+            saver.join()
+            
+            # 发送停止信号给解码线程，等待其放回未提交批次的缓冲区后结束
+            stop_event.set()
+            decoder.join()
             
             # 计算处理时间
             elapsed_time = time.time() - start_time
@@ -358,19 +935,46 @@ class VideoProcessor:
             return []
         finally:
             self.is_processing = False
+            self._stop_requested = False
+            # 取消尚未开始的检测批次，等待正在检测的批次结束后放回剩余批次的缓冲区
+            if self.detector_pool is not None:
+                self.detector_pool.shutdown(wait=True, cancel_futures=True)
+                self.detector_pool = None
+            self._drain_pending_batches()
+            self._release_buffers()
     
     def stop_processing(self):
-        """停止视频处理"""
+        """停止视频处理，在加载视频期间调用时会终止扫描转码，之后的process_video()直接返回"""
+        self._stop_requested = True
         self.is_processing = False
+        if self.stop_event:
+            self.stop_event.set()
         
-    def get_detection_results(self):
+    def get_detection_results(self, start=0, end=None):
         """
         获取检测结果
         
+        先读取已发布的结果数再切片，写入线程只追加结果，因此读取时无需加锁。
+        
+        Args:
+            start: 起始索引
+            end: 结束索引，None表示到当前已发布的最后一个结果
+        
         Returns:
             list: 检测结果列表
         """
-        return self.detection_results
+        count = self._result_count
+        end = count if end is None else min(end, count)
+        return self.detection_results[start:end]
+    
+    def get_result_count(self):
+        """
+        获取当前已发布的检测结果数量
+        
+        Returns:
+            int: 检测结果数量
+        """
+        return self._result_count
     
     def get_progress_info(self):
         """
@@ -387,5 +991,6 @@ class VideoProcessor:
             'processed_frames': self.processed_frames,
             'matched_frames': self.matched_frames,
             'progress': progress,
+            'transcode_progress': self.transcode_progress,
             'is_processing': self.is_processing
         } 
\ No newline at end of file
@@ -36,8 +36,18 @@ $(document).ready(function() {
         // 创建FormData对象
         const formData = new FormData(this);
         
-        // 开始处理
-        startProcessing(formData);
+        // 大视频先分块上传，表单中只提交上传ID
+        const videoFile = $('#videoFile')[0].files[0];
+        if (videoFile && videoFile.size > CHUNK_UPLOAD_THRESHOLD) {
+            uploadInChunks(videoFile, function(uploadId) {
+                formData.delete('videoFile');
+                formData.append('videoUploadId', uploadId);
+                startProcessing(formData);
+            }, handleError);
+        } else {
+            // 开始处理
+            startProcessing(formData);
+        }
     });
     
     // 停止处理按钮
@@ -62,6 +72,54 @@ $(document).ready(function() {
 // 全局变量，用于跟踪已显示的结果数量
 let displayedResultsCount = 0;
 
+// 超过该大小的视频分块上传（字节）
+const CHUNK_UPLOAD_THRESHOLD = 64 * 1024 * 1024;
+// 分块大小（字节）
+const CHUNK_SIZE = 8 * 1024 * 1024;
+
+// 按顺序分块上传视频文件，完成后回调上传ID
+function uploadInChunks(file, onComplete, onError) {
+    let uploadId = null;
+    
+    function sendChunk(start) {
+        const end = Math.min(start + CHUNK_SIZE, file.size);
+        const query = uploadId
+            ? 'upload_id=' + encodeURIComponent(uploadId)
+            : 'filename=' + encodeURIComponent(file.name);
+        
+        $.ajax({
+            url: '/upload_chunk?' + query,
+            type: 'POST',
+            data: file.slice(start, end),
+            contentType: 'application/octet-stream',
+            processData: false,
+            headers: {
+                'Content-Range': 'bytes ' + start + '-' + (end - 1) + '/' + file.size
+            },
+            success: function(response) {
+                if (!response.success) {
+                    onError(response.error);
+                    return;
+                }
+                
+                uploadId = response.upload_id;
+                $('#processStatus').text('上传中 - ' + Math.round(response.received / file.size * 100) + '%');
+                
+                if (response.completed) {
+                    onComplete(uploadId);
+                } else {
+                    sendChunk(response.received);
+                }
+            },
+            error: function(xhr, status, error) {
+                onError('上传失败: ' + error);
+            }
+        });
+    }
+    
+    sendChunk(0);
+}
+
 // 开始处理视频
 function startProcessing(formData) {
     // 重置界面
@@ -100,41 +158,85 @@ function startProcessing(formData) {
     });
 }
 
-// 轮询处理进度
+// 处理一次进度更新，返回任务是否已结束
+function handleProgress(response) {
+    if (!response.success) {
+        handleError(response.error);
+        return true;
+    }
+    
+    // 更新进度条和状态信息（扫描转码期间显示转码进度）
+    if (response.transcode_progress !== null && response.transcode_progress !== undefined) {
+        const transcodeProgress = response.transcode_progress * 100;
+        $('#progressBar').css('width', transcodeProgress + '%');
+        $('#processStatus').text('转码中 - ' + Math.round(transcodeProgress) + '%');
+    } else {
+        const progress = response.progress * 100;
+        $('#progressBar').css('width', progress + '%');
+        $('#processStatus').text('处理中 - ' + Math.round(progress) + '%');
+    }
+    
+    // 如果有预览图像
+    // 预览URL带有版本号，只有图像更新后才重新加载
+    if (response.preview_image && $('#previewImage').attr('src') !== response.preview_image) {
+        $('#previewImage').attr('src', response.preview_image);
+    }
+    
+    // 如果有新的检测结果
+    if (response.new_results && response.new_results.length > 0) {
+        // 显示结果卡片
+        $('#resultsCard').removeClass('d-none');
+        
+        // 添加新结果
+        appendResults(response.new_results);
+        
+        // 更新已显示的结果计数
+        displayedResultsCount += response.new_results.length;
+    }
+    
+    // 如果处理完成
+    if (response.completed) {
+        processingCompleted(response);
+        return true;
+    }
+    return false;
+}
+
+// 监听处理进度：优先使用服务器推送（SSE），浏览器不支持时回退到轮询
 function pollProgress(taskId) {
+    if (!window.EventSource) {
+        pollProgressInterval(taskId);
+        return;
+    }
+    
+    const source = new EventSource('/progress/' + taskId + '?current_count=' + displayedResultsCount);
+    source.onmessage = function(event) {
+        if (handleProgress(JSON.parse(event.data))) {
+            source.close();
+        }
+    };
+    source.onerror = function() {
+        // 连接中断时关闭推送，改为轮询
+        source.close();
+        if (window.progressSource === source) {
+            window.progressSource = null;
+            pollProgressInterval(taskId);
+        }
+    };
+    
+    // 保存连接以便停止
+    window.progressSource = source;
+}
+
+// 轮询处理进度
+function pollProgressInterval(taskId) {
     const progressInterval = setInterval(function() {
         $.ajax({
             url: '/progress/' + taskId + '?current_count=' + displayedResultsCount,
             type: 'GET',
             success: function(response) {
-                // 更新进度条
-                const progress = response.progress * 100;
-                $('#progressBar').css('width', progress + '%');
-                
-                // 更新状态信息
-                $('#processStatus').text('处理中 - ' + Math.round(progress) + '%');
-                
-                // 如果有预览图像
-                if (response.preview_image) {
-                    $('#previewImage').attr('src', response.preview_image + '?' + new Date().getTime());
-                }
-                
-                // 如果有新的检测结果
-                if (response.new_results && response.new_results.length > 0) {
-                    // 显示结果卡片
-                    $('#resultsCard').removeClass('d-none');
-                    
-                    // 添加新结果
-                    appendResults(response.new_results);
-                    
-                    // 更新已显示的结果计数
-                    displayedResultsCount += response.new_results.length;
-                }
-                
-                // 如果处理完成
-                if (response.completed) {
+                if (handleProgress(response)) {
                     clearInterval(progressInterval);
-                    processingCompleted(response);
                 }
             },
             error: function(xhr, status, error) {
@@ -207,7 +309,11 @@ function processingCompleted(response) {
 
 // 停止处理
 function stopProcessing() {
-    // 清除轮询定时器
+    // 关闭进度推送连接并清除轮询定时器
+    if (window.progressSource) {
+        window.progressSource.close();
+        window.progressSource = null;
+    }
     if (window.progressInterval) {
         clearInterval(window.progressInterval);
     }
@@ -0,0 +1,28 @@
+"""
+测试配置：把项目根目录加入导入路径，并把输出目录指向临时目录
+"""
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# config在导入时创建输出目录，测试期间不写入项目目录
+os.environ.setdefault('OUTPUT_DIR', tempfile.mkdtemp(prefix='face_test_'))
+os.environ.setdefault('PREVIEW_DIR', os.path.join(os.environ['OUTPUT_DIR'], 'preview'))
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """生成40帧的测试视频，第i帧的像素值均为i*6，便于根据像素判断读到的是第几帧"""
+    path = str(tmp_path / 'sample.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for i in range(40):
+        writer.write(np.full((48, 64, 3), i * 6, dtype=np.uint8))
+    writer.release()
+    return path
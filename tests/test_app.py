@@ -0,0 +1,223 @@
+"""
+Flask路由测试
+"""
+import io
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('cv2')
+pytest.importorskip('face_recognition')
+
+import app as app_module
+from modules.task_store import ProgressNotifier
+
+VIDEO_SIZE = 200
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # 不实际处理视频，只验证任务的创建和提交
+    submitted = []
+    monkeypatch.setattr(app_module, 'process_video_task', lambda *args: submitted.append(args))
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        client.submitted = submitted
+        yield client
+
+
+def test_upload_creates_task(client):
+    response = client.post('/upload', data={
+        'referFace': (io.BytesIO(b'face'), 'face.jpg'),
+        'videoFile': (io.BytesIO(b'video'), 'video.mp4'),
+        'tolerance': '0.5'
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+
+    task = app_module.tasks.get(data['task_id'])
+    assert task is not None
+    task['future'].result(timeout=5)
+    assert len(client.submitted) == 1
+
+
+def test_progress_not_completed_while_loading(client):
+    response = client.post('/upload', data={
+        'referFace': (io.BytesIO(b'face'), 'face.jpg'),
+        'videoFile': (io.BytesIO(b'video'), 'video.mp4')
+    }, content_type='multipart/form-data')
+    task_id = response.get_json()['task_id']
+    task = app_module.tasks.get(task_id)
+    task['future'].result(timeout=5)
+
+    # 模拟正在加载视频：处理器已创建但尚未开始处理
+    task['processor'] = app_module.VideoProcessor(None)
+    data = client.get(f'/progress/{task_id}').get_json()
+    assert data['success'] is True
+    assert data['completed'] is False
+
+    task['is_processing'] = False
+    task['completed'] = True
+    data = client.get(f'/progress/{task_id}').get_json()
+    assert data['completed'] is True
+
+
+class FakeProcessor:
+    def __init__(self):
+        self.stopped = False
+
+    def stop_processing(self):
+        self.stopped = True
+
+
+def make_task(future):
+    return {'is_processing': True, 'future': future, 'processor': FakeProcessor(),
+            'notifier': ProgressNotifier(), 'completed': False}
+
+
+def test_stop_running_task_only_signals():
+    future = Future()
+    future.set_running_or_notify_cancel()
+    task = make_task(future)
+
+    assert app_module.stop_task(task) is True
+    assert task['processor'].stopped
+    assert task['stop_requested']
+    # 处理线程退出前任务仍处于处理中，不会被淘汰
+    assert task['is_processing'] is True
+    assert task['notifier'].version == 1
+
+
+def test_stop_queued_task_cancels_it():
+    task = make_task(Future())
+
+    assert app_module.stop_task(task) is True
+    assert task['future'].cancelled()
+    assert not task['processor'].stopped
+    assert task['is_processing'] is False
+    assert task['completed'] is True
+
+
+def test_stop_finished_task_is_rejected():
+    future = Future()
+    future.set_result(None)
+    task = make_task(future)
+    task['is_processing'] = False
+
+    assert app_module.stop_task(task) is False
+    assert not task['processor'].stopped
+
+
+def send_chunk(client, data, start, upload_id=None, stop=None, total=VIDEO_SIZE):
+    """发送一个分块，stop为Content-Range声明的结束位置（不含），默认按数据长度计算"""
+    if stop is None:
+        stop = start + len(data)
+    query = {'upload_id': upload_id} if upload_id else {'filename': 'video.mp4'}
+    response = client.post('/upload_chunk', query_string=query, data=data, headers={
+        'Content-Range': f'bytes {start}-{stop - 1}/{total}'
+    })
+    return response.get_json()
+
+
+def upload_path(upload_id):
+    return app_module.chunk_uploads[upload_id]['path']
+
+
+def test_chunked_upload_renames_on_last_chunk(client):
+    payload = os.urandom(VIDEO_SIZE)
+    data = send_chunk(client, payload[:100], 0)
+    assert data['success'] is True
+    assert data['received'] == 100 and data['completed'] is False
+    upload_id = data['upload_id']
+    path = upload_path(upload_id)
+    assert not os.path.exists(path)
+
+    data = send_chunk(client, payload[100:], 100, upload_id)
+    assert data['success'] is True
+    assert data['completed'] is True
+    assert not os.path.exists(path + '.part')
+    with open(path, 'rb') as f:
+        assert f.read() == payload
+
+    # 上传完成后/upload只需要提交上传ID
+    response = client.post('/upload', data={
+        'referFace': (io.BytesIO(b'face'), 'face.jpg'),
+        'videoUploadId': upload_id
+    }, content_type='multipart/form-data')
+    task_id = response.get_json()['task_id']
+    assert app_module.tasks.get(task_id)['video_path'] == path
+    assert upload_id not in app_module.chunk_uploads
+
+
+def test_out_of_order_chunk_is_rejected(client):
+    payload = os.urandom(VIDEO_SIZE)
+    upload_id = send_chunk(client, payload[:100], 0)['upload_id']
+
+    data = send_chunk(client, payload[150:], 150, upload_id)
+    assert data['success'] is False
+    assert data['upload_id'] == upload_id
+    assert data['received'] == 100
+    assert os.path.getsize(upload_path(upload_id) + '.part') == 100
+
+    # 首个分块只能从文件开头开始
+    data = send_chunk(client, payload[100:], 100)
+    assert data['success'] is False
+
+
+def test_short_chunk_is_truncated(client):
+    payload = os.urandom(VIDEO_SIZE)
+    # 声明100字节但只发送60字节
+    data = send_chunk(client, payload[:60], 0, stop=100)
+    assert data['success'] is False
+    assert data['received'] == 0
+    upload_id = data['upload_id']
+    assert os.path.getsize(upload_path(upload_id) + '.part') == 0
+
+    # 客户端可以使用返回的上传ID从received处重传
+    assert send_chunk(client, payload[:100], 0, upload_id)['success'] is True
+    data = send_chunk(client, payload[100:160], 100, upload_id, stop=VIDEO_SIZE)
+    assert data['success'] is False
+    assert data['received'] == 100
+    assert os.path.getsize(upload_path(upload_id) + '.part') == 100
+
+    data = send_chunk(client, payload[100:], 100, upload_id)
+    assert data['completed'] is True
+    with open(upload_path(upload_id), 'rb') as f:
+        assert f.read() == payload
+
+
+def test_duplicate_last_chunk_is_rejected(client):
+    payload = os.urandom(VIDEO_SIZE)
+    upload_id = send_chunk(client, payload[:100], 0)['upload_id']
+    assert send_chunk(client, payload[100:], 100, upload_id)['completed'] is True
+
+    data = send_chunk(client, payload[100:], 100, upload_id)
+    assert data['success'] is False
+    assert data['received'] == VIDEO_SIZE
+    with open(upload_path(upload_id), 'rb') as f:
+        assert f.read() == payload
+
+
+def test_abandoned_upload_expires(client, monkeypatch):
+    payload = os.urandom(VIDEO_SIZE)
+    upload_id = send_chunk(client, payload[:100], 0)['upload_id']
+    part_path = upload_path(upload_id) + '.part'
+    assert os.path.exists(part_path)
+
+    monkeypatch.setattr(app_module, 'CHUNK_UPLOAD_TTL', 60)
+    app_module.chunk_uploads[upload_id]['updated_at'] = time.time() - 120
+
+    # 任何新的分块请求都会清理过期的上传任务
+    send_chunk(client, payload[:100], 0)
+    assert upload_id not in app_module.chunk_uploads
+    assert not os.path.exists(part_path)
+
+    data = send_chunk(client, payload[100:], 100, upload_id)
+    assert data['success'] is False
+    assert data['error'] == '上传任务不存在'
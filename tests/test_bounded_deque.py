@@ -0,0 +1,95 @@
+"""
+有界队列测试
+"""
+import queue
+import threading
+import time
+
+import pytest
+
+from modules.bounded_deque import BoundedDeque
+
+
+def test_fifo_order():
+    q = BoundedDeque()
+    for i in range(5):
+        q.put(i)
+    assert q.qsize() == 5
+    assert [q.get() for _ in range(5)] == list(range(5))
+
+
+def test_get_timeout_raises_empty():
+    q = BoundedDeque()
+    start = time.monotonic()
+    with pytest.raises(queue.Empty):
+        q.get(timeout=0.05)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_put_timeout_raises_full():
+    q = BoundedDeque(maxsize=1)
+    q.put('a')
+    with pytest.raises(queue.Full):
+        q.put('b', timeout=0.05)
+    # 失败的put不改变队列内容
+    assert q.qsize() == 1
+    assert q.get() == 'a'
+
+
+def test_put_blocks_until_space():
+    q = BoundedDeque(maxsize=1)
+    q.put('a')
+    done = threading.Event()
+
+    def producer():
+        q.put('b')
+        done.set()
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    assert not done.wait(0.05)
+    assert q.get() == 'a'
+    assert done.wait(1)
+    assert q.get() == 'b'
+    thread.join()
+
+
+def test_get_blocks_until_item():
+    q = BoundedDeque()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(q.get(timeout=1)))
+    thread.start()
+    time.sleep(0.05)
+    q.put('x')
+    thread.join()
+    assert result == ['x']
+
+
+def test_unbounded_when_maxsize_is_zero():
+    q = BoundedDeque(maxsize=0)
+    for i in range(1000):
+        q.put(i, timeout=0)
+    assert q.qsize() == 1000
+
+
+def test_join_waits_for_task_done():
+    q = BoundedDeque()
+    q.put(1)
+    q.put(2)
+    joined = threading.Event()
+    thread = threading.Thread(target=lambda: (q.join(), joined.set()))
+    thread.start()
+
+    q.get()
+    q.task_done()
+    assert not joined.wait(0.05)
+    q.get()
+    q.task_done()
+    assert joined.wait(1)
+    thread.join()
+
+
+def test_task_done_too_many_times():
+    q = BoundedDeque()
+    with pytest.raises(ValueError):
+        q.task_done()
@@ -0,0 +1,44 @@
+"""
+缓冲区池测试
+"""
+import numpy as np
+
+from modules.buffer_pool import BufferPool
+
+
+def test_acquire_allocates_requested_shape():
+    pool = BufferPool((4, 6, 3))
+    buffer = pool.acquire()
+    assert buffer.shape == (4, 6, 3)
+    assert buffer.dtype == np.uint8
+    assert pool.outstanding == 1
+
+
+def test_released_buffer_is_reused():
+    pool = BufferPool((2, 2))
+    buffer = pool.acquire()
+    pool.release(buffer)
+    assert pool.outstanding == 0
+    assert pool.acquire() is buffer
+
+
+def test_keeps_at_most_max_buffers():
+    pool = BufferPool((2, 2), max_buffers=2)
+    buffers = [pool.acquire() for _ in range(3)]
+    for buffer in buffers:
+        pool.release(buffer)
+    assert pool.outstanding == 0
+    reused = [pool.acquire() for _ in range(3)]
+    assert sum(any(b is r for b in buffers) for r in reused) == 2
+
+
+def test_foreign_buffers_are_ignored():
+    pool = BufferPool((2, 2), dtype=np.float32)
+    buffer = pool.acquire()
+    pool.release(None)
+    pool.release(np.empty((3, 3), dtype=np.float32))
+    pool.release(np.empty((2, 2), dtype=np.uint8))
+    assert pool.outstanding == 1
+    pool.release(buffer)
+    assert pool.outstanding == 0
+    assert pool.acquire() is buffer
@@ -0,0 +1,138 @@
+"""
+人脸匹配测试
+"""
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from modules import face_detector
+from modules.face_detector import DetectionContext, FaceDetector
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return FaceDetector()
+
+
+def float_matches(detector, encodings, ctx):
+    distances = detector.face_distances(encodings, ctx)
+    indices = np.flatnonzero(distances < ctx.tolerance)
+    return indices, distances[indices]
+
+
+def random_encodings(rng, reference, count):
+    # 与参考人脸的距离分布在阈值附近，匹配和不匹配的候选都有
+    sigmas = np.linspace(0.02, 0.07, count, dtype=np.float32)[:, None]
+    return reference + rng.normal(size=(count, reference.shape[0])).astype(np.float32) * sigmas
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_int8_prefilter_matches_float_path(detector, seed):
+    rng = np.random.default_rng(seed)
+    reference = rng.normal(0, 0.1, 128).astype(np.float32)
+    ctx = DetectionContext(reference, tolerance=0.5)
+    assert FaceDetector._use_quantized(ctx)
+
+    encodings = random_encodings(rng, reference, 400)
+    indices, distances = detector.match_encodings(encodings, ctx)
+    expected_indices, expected_distances = float_matches(detector, encodings, ctx)
+
+    assert 0 < len(expected_indices) < len(encodings)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(distances, expected_distances)
+
+
+def test_int8_prefilter_with_clipped_components(detector):
+    rng = np.random.default_rng(42)
+    reference = rng.normal(0, 0.1, 128).astype(np.float32)
+    ctx = DetectionContext(reference, tolerance=0.5)
+
+    # 把参考人脸绝对值最大的分量推出量化范围，量化时会被截断到±127
+    encodings = random_encodings(rng, reference, 400)
+    peak = int(np.argmax(np.abs(reference)))
+    encodings[:, peak] = reference[peak] + np.sign(reference[peak]) * rng.uniform(0.01, 0.2, len(encodings))
+    assert np.any(np.abs(encodings * ctx.quant_scale) > 127)
+
+    indices, distances = detector.match_encodings(encodings, ctx)
+    expected_indices, expected_distances = float_matches(detector, encodings, ctx)
+
+    assert len(expected_indices) > 0
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(distances, expected_distances)
+
+
+def test_tight_tolerance_falls_back_to_float_path(detector):
+    rng = np.random.default_rng(7)
+    reference = rng.normal(0, 0.1, 128).astype(np.float32)
+    ctx = DetectionContext(reference, tolerance=0.05)
+    assert not FaceDetector._use_quantized(ctx)
+
+    encodings = reference + rng.normal(0, 0.004, (200, 128)).astype(np.float32)
+    indices, distances = detector.match_encodings(encodings, ctx)
+    expected_indices, expected_distances = float_matches(detector, encodings, ctx)
+
+    assert 0 < len(expected_indices) < len(encodings)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(distances, expected_distances)
+
+
+class TestEmbeddingCache:
+    """参考人脸特征缓存按参考图像分别加锁"""
+
+    @pytest.fixture
+    def detector(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(face_detector, 'EMBEDDINGS_DIR', tmp_path)
+        detector = FaceDetector()
+        detector.extracted = []
+        return detector
+
+    def write_face(self, tmp_path, name, content):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+
+    def run_concurrently(self, detector, paths):
+        contexts = [None] * len(paths)
+
+        def create(i):
+            contexts[i] = detector.create_context(paths[i])
+
+        threads = [threading.Thread(target=create, args=(i,)) for i in range(len(paths))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        return contexts
+
+    def test_same_image_is_extracted_once(self, detector, tmp_path, monkeypatch):
+        def extract(face_path):
+            detector.extracted.append(face_path)
+            threading.Event().wait(0.1)
+            return np.ones(128)
+
+        monkeypatch.setattr(detector, '_extract_reference_encoding', extract)
+        paths = [self.write_face(tmp_path, f'face{i}.jpg', b'same') for i in range(3)]
+        contexts = self.run_concurrently(detector, paths)
+
+        assert len(detector.extracted) == 1
+        assert all(ctx is not None for ctx in contexts)
+        assert face_detector._embedding_cache_locks == {}
+
+    def test_different_images_do_not_block_each_other(self, detector, tmp_path, monkeypatch):
+        # 两个提取都进入后才能继续，串行执行时会超时失败
+        barrier = threading.Barrier(2, timeout=2)
+
+        def extract(face_path):
+            detector.extracted.append(face_path)
+            barrier.wait()
+            return np.ones(128)
+
+        monkeypatch.setattr(detector, '_extract_reference_encoding', extract)
+        paths = [self.write_face(tmp_path, 'a.jpg', b'a'), self.write_face(tmp_path, 'b.jpg', b'b')]
+        contexts = self.run_concurrently(detector, paths)
+
+        assert len(detector.extracted) == 2
+        assert all(ctx is not None for ctx in contexts)
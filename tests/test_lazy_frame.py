@@ -0,0 +1,51 @@
+"""
+延迟求值帧测试
+"""
+import numpy as np
+
+from modules.lazy_frame import LazyFrame, as_array
+
+
+def test_operations_run_only_when_read():
+    calls = []
+
+    def fill(frame, value):
+        calls.append(value)
+        frame[:] = value
+        return frame
+
+    source = np.zeros((4, 4, 3), dtype=np.uint8)
+    lazy = LazyFrame(source, [(fill, (7,))])
+    assert calls == []
+    assert lazy.shape == (4, 4, 3)
+    assert source.max() == 0
+
+    result = as_array(lazy)
+    assert calls == [7]
+    assert result.max() == 7
+
+    # 结果被缓存，操作只执行一次
+    assert as_array(lazy) is result
+    assert lazy.materialize() is result
+    assert calls == [7]
+
+
+def test_operations_are_chained_in_order():
+    source = np.ones((2, 2), dtype=np.float32)
+    lazy = LazyFrame(source, [
+        (lambda frame, value: frame + value, (1,)),
+        (lambda frame, value: frame * value, (3,)),
+    ])
+    np.testing.assert_array_equal(lazy.materialize(), np.full((2, 2), 6, dtype=np.float32))
+
+
+def test_numpy_coercion():
+    source = np.arange(6, dtype=np.uint8).reshape(2, 3)
+    lazy = LazyFrame(source)
+    np.testing.assert_array_equal(np.asarray(lazy), source)
+    assert np.asarray(lazy, dtype=np.float32).dtype == np.float32
+
+
+def test_as_array_passes_plain_arrays_through():
+    frame = np.zeros((2, 2), dtype=np.uint8)
+    assert as_array(frame) is frame
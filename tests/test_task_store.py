@@ -0,0 +1,121 @@
+"""
+任务存储测试
+"""
+import time
+import threading
+
+from modules.task_store import TaskStore, ProgressNotifier
+
+
+def make_store(maxsize=2, ttl=60):
+    evicted = []
+    store = TaskStore(maxsize=maxsize, ttl=ttl, on_evict=lambda task_id, task: evicted.append(task_id))
+    return store, evicted
+
+
+def test_get_and_contains():
+    store, _ = make_store()
+    store['a'] = {'is_processing': False}
+    assert 'a' in store
+    assert store.get('a') == {'is_processing': False}
+    assert store.get('missing') is None
+    assert store.get('missing', 'default') == 'default'
+    assert len(store) == 1
+
+
+def test_evicts_least_recently_used():
+    store, evicted = make_store(maxsize=2)
+    store['a'] = {}
+    store['b'] = {}
+    # 访问a后b成为最久未访问的任务
+    store.get('a')
+    store['c'] = {}
+    assert evicted == ['b']
+    assert 'a' in store and 'c' in store and 'b' not in store
+
+
+def test_expires_after_ttl():
+    store, evicted = make_store(maxsize=10, ttl=0.05)
+    store['a'] = {}
+    store['b'] = {}
+    time.sleep(0.1)
+    assert store.get('a') is None
+    assert sorted(evicted) == ['a', 'b']
+    assert len(store) == 0
+
+
+def test_access_refreshes_ttl():
+    store, evicted = make_store(maxsize=10, ttl=0.2)
+    store['a'] = {}
+    for _ in range(3):
+        time.sleep(0.1)
+        assert store.get('a') is not None
+    assert evicted == []
+
+
+def test_processing_task_is_never_evicted():
+    store, evicted = make_store(maxsize=1, ttl=0.05)
+    running = {'is_processing': True}
+    store['running'] = running
+    store['done'] = {'is_processing': False}
+    time.sleep(0.1)
+    store.get('other')
+    assert 'running' in store
+    assert evicted == ['done']
+
+    # 处理结束后才可以被淘汰
+    running['is_processing'] = False
+    store.get('other')
+    assert evicted == ['done', 'running']
+
+
+def test_evict_callback_errors_are_contained():
+    def on_evict(task_id, task):
+        raise RuntimeError('boom')
+
+    store = TaskStore(maxsize=1, ttl=60, on_evict=on_evict)
+    store['a'] = {}
+    store['b'] = {}
+    assert 'b' in store and 'a' not in store
+
+
+def test_values_returns_snapshot():
+    store, _ = make_store(maxsize=10)
+    store['a'] = {'id': 'a'}
+    store['b'] = {'id': 'b'}
+    values = store.values()
+    store['c'] = {'id': 'c'}
+    assert [task['id'] for task in values] == ['a', 'b']
+
+
+def test_notifier_wakes_every_waiter():
+    notifier = ProgressNotifier()
+    version = notifier.version
+    woken = []
+
+    def waiter():
+        woken.append(notifier.wait(version, timeout=5))
+
+    threads = [threading.Thread(target=waiter) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    notifier.notify()
+    for thread in threads:
+        thread.join(timeout=5)
+    # 每个等待者都收到了同一次通知，不会被其他等待者消费掉
+    assert woken == [version + 1] * 3
+
+
+def test_notifier_returns_immediately_after_missed_notify():
+    notifier = ProgressNotifier()
+    version = notifier.version
+    notifier.notify()
+    start = time.monotonic()
+    assert notifier.wait(version, timeout=5) == version + 1
+    assert time.monotonic() - start < 1
+
+
+def test_notifier_wait_times_out():
+    notifier = ProgressNotifier()
+    assert notifier.wait(notifier.version, timeout=0.05) == 0
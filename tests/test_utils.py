@@ -0,0 +1,112 @@
+"""
+工具函数测试
+"""
+import io
+import os
+
+import pytest
+
+from modules import utils
+from modules.utils import format_time, transcode_for_scan
+
+
+@pytest.mark.parametrize('seconds, expected', [
+    (0, '00:00:00'),
+    (59.99, '00:00:59'),
+    (60, '00:01:00'),
+    (3599.5, '00:59:59'),
+    (3600, '01:00:00'),
+    (3 * 3600 + 25 * 60 + 7.2, '03:25:07'),
+    (100 * 3600, '100:00:00'),
+])
+def test_format_time(seconds, expected):
+    assert format_time(seconds) == expected
+
+
+class FakeFFmpeg:
+    """代替ffmpeg进程：按-progress的格式逐行输出进度，结束时写入输出文件"""
+
+    def __init__(self, frames, returncode=0):
+        self.frames = frames
+        self.returncode_on_exit = returncode
+        self.started = []
+        self.terminated = False
+
+    def __call__(self, args, stdout=None, text=None):
+        self.started.append(args)
+        output_path = args[-1]
+        fake = self
+
+        class Process:
+            returncode = None
+
+            def __init__(self):
+                lines = ''.join(f'frame={frame}\nprogress=continue\n' for frame in fake.frames)
+                self.stdout = io.StringIO(lines + 'progress=end\n')
+
+            def poll(self):
+                return self.returncode
+
+            def wait(self):
+                if self.returncode is None:
+                    if not fake.terminated:
+                        with open(output_path, 'wb') as f:
+                            f.write(b'mjpeg')
+                    self.returncode = -15 if fake.terminated else fake.returncode_on_exit
+                return self.returncode
+
+            def terminate(self):
+                fake.terminated = True
+
+            kill = terminate
+
+        return Process()
+
+
+class TestTranscodeForScan:
+    @pytest.fixture
+    def video(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils, 'TRANSCODE_DIR', tmp_path / 'transcode')
+        (tmp_path / 'transcode').mkdir()
+        monkeypatch.setattr(utils.shutil, 'which', lambda name: '/usr/bin/' + name)
+        monkeypatch.setattr(utils, '_ffmpeg_passthrough_args', lambda: ['-fps_mode', 'passthrough'])
+        path = tmp_path / 'video.mp4'
+        path.write_bytes(os.urandom(4096))
+        return str(path)
+
+    def test_reports_progress_and_caches(self, video, monkeypatch):
+        ffmpeg = FakeFFmpeg([25, 50, 100])
+        monkeypatch.setattr(utils.subprocess, 'Popen', ffmpeg)
+        progress = []
+
+        path = transcode_for_scan(video, 32, 24, frame_count=100, progress_callback=progress.append)
+        assert path and os.path.exists(path)
+        assert progress == [0.25, 0.5, 1.0]
+        assert ffmpeg.started[0][-3:-1] == ['-progress', 'pipe:1']
+
+        # 第二次直接使用缓存，不再启动ffmpeg
+        assert transcode_for_scan(video, 32, 24) == path
+        assert len(ffmpeg.started) == 1
+
+    def test_stop_terminates_ffmpeg(self, video, monkeypatch):
+        ffmpeg = FakeFFmpeg([10, 20, 30])
+        monkeypatch.setattr(utils.subprocess, 'Popen', ffmpeg)
+        progress = []
+
+        path = transcode_for_scan(video, 32, 24, frame_count=100, should_stop=lambda: len(progress) >= 1,
+                                  progress_callback=progress.append)
+        assert path is None
+        assert ffmpeg.terminated
+        assert os.listdir(utils.TRANSCODE_DIR) == []
+
+    def test_failed_transcode_leaves_no_file(self, video, monkeypatch):
+        monkeypatch.setattr(utils.subprocess, 'Popen', FakeFFmpeg([10], returncode=1))
+        assert transcode_for_scan(video, 32, 24) is None
+        assert os.listdir(utils.TRANSCODE_DIR) == []
+
+    def test_cache_key_changes_with_file(self, video):
+        key = utils._scan_cache_key(video)
+        assert utils._scan_cache_key(video) == key
+        with open(video, 'ab') as f:
+            f.write(b'more')
+        assert utils._scan_cache_key(video) != key
@@ -0,0 +1,128 @@
+"""
+视频读取后端测试
+"""
+import cv2
+import numpy as np
+import pytest
+
+from modules import video_io
+from modules.video_io import NVDecCapture, PyAVCapture, av, open_video
+
+# 测试视频的帧数，见conftest.video_path
+FRAME_COUNT = 40
+
+
+def frame_number(frame):
+    return int(round(float(frame.mean()) / 6))
+
+
+@pytest.mark.skipif(av is None, reason='未安装PyAV')
+class TestPyAVCapture:
+    def test_properties(self, video_path):
+        capture = PyAVCapture(video_path, hwaccel=False)
+        assert capture.isOpened()
+        assert capture.get(cv2.CAP_PROP_FRAME_WIDTH) == 64
+        assert capture.get(cv2.CAP_PROP_FRAME_HEIGHT) == 48
+        assert capture.get(cv2.CAP_PROP_FPS) == 25
+        assert capture.get(cv2.CAP_PROP_FRAME_COUNT) == FRAME_COUNT
+        capture.release()
+        assert not capture.isOpened()
+
+    def test_sequential_read(self, video_path):
+        capture = PyAVCapture(video_path, hwaccel=False)
+        numbers = []
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            assert frame.shape == (48, 64, 3)
+            numbers.append(frame_number(frame))
+        assert numbers == list(range(FRAME_COUNT))
+        assert capture.get(cv2.CAP_PROP_POS_FRAMES) == FRAME_COUNT
+
+    def test_grab_then_retrieve(self, video_path):
+        capture = PyAVCapture(video_path, hwaccel=False)
+        for _ in range(5):
+            assert capture.grab()
+        ret, frame = capture.retrieve()
+        assert ret
+        assert frame_number(frame) == 4
+
+    @pytest.mark.parametrize('target', [0, 1, 17, 39])
+    def test_seek(self, video_path, target):
+        capture = PyAVCapture(video_path, hwaccel=False)
+        # 先读几帧再跳转，跳转目标在当前位置之前和之后都要正确
+        for _ in range(10):
+            capture.grab()
+        assert capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+        assert capture.get(cv2.CAP_PROP_POS_FRAMES) == target
+        ret, frame = capture.read()
+        assert ret
+        assert frame_number(frame) == target
+        assert capture.get(cv2.CAP_PROP_POS_FRAMES) == target + 1
+
+    def test_read_past_end(self, video_path):
+        capture = PyAVCapture(video_path, hwaccel=False)
+        capture.set(cv2.CAP_PROP_POS_FRAMES, FRAME_COUNT - 1)
+        assert capture.read()[0]
+        assert capture.read() == (False, None)
+
+
+class FakeNVReader:
+    """代替ffmpegcv的NVDEC读取器，frames为None时模拟没有可用GPU、读不到任何帧"""
+
+    def __init__(self, frames):
+        self.frames = list(frames) if frames is not None else []
+        self.released = False
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+    def release(self):
+        self.released = True
+
+
+class TestNVDecCapture:
+    @pytest.fixture
+    def ffmpegcv(self, monkeypatch):
+        class FakeFFmpegCV:
+            frames = None
+            readers = []
+
+            @classmethod
+            def VideoCaptureNV(cls, video_path, **kwargs):
+                cls.readers.append(FakeNVReader(cls.frames))
+                return cls.readers[-1]
+
+        monkeypatch.setattr(video_io, 'ffmpegcv', FakeFFmpegCV)
+        return FakeFFmpegCV
+
+    def test_probed_frame_is_returned_first(self, ffmpegcv):
+        ffmpegcv.frames = [np.full((48, 64, 3), i, dtype=np.uint8) for i in range(3)]
+        capture = NVDecCapture('video.mp4')
+        assert capture.isOpened()
+
+        values = []
+        while True:
+            ret, frame = capture.read_rgb()
+            if not ret:
+                break
+            values.append(int(frame[0, 0, 0]))
+        assert values == [0, 1, 2]
+        assert capture.get(cv2.CAP_PROP_POS_FRAMES) == 3
+
+    def test_undecodable_video_is_not_opened(self, ffmpegcv):
+        capture = NVDecCapture('video.mp4')
+        assert not capture.isOpened()
+        assert ffmpegcv.readers[0].released
+
+    def test_open_video_falls_back(self, ffmpegcv, video_path):
+        capture = open_video(video_path, backend='nvdec')
+        assert not isinstance(capture, NVDecCapture)
+        if av is not None:
+            assert isinstance(capture, PyAVCapture)
+        assert capture.isOpened()
+        assert capture.read()[0]
+        capture.release()
@@ -0,0 +1,199 @@
+"""
+视频处理器测试
+"""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from modules import video_processor
+from modules.video_io import av
+from modules.video_processor import VideoProcessor
+
+
+def frame_number(frame):
+    return int(round(float(frame.mean()) / 6))
+
+
+@pytest.mark.skipif(av is None, reason='未安装PyAV')
+class TestKeyframeSeek:
+    @pytest.fixture
+    def processor(self, video_path):
+        processor = VideoProcessor(FakeDetector(), detection_frequency=15, backend='pyav')
+        assert processor.load_video(video_path)
+        # 测试环境不依赖ffprobe，直接指定关键帧
+        processor.keyframes = [0, 10, 20, 30]
+        yield processor
+        processor.close_video()
+
+    def test_seeks_to_keyframe_before_next_sample(self, processor):
+        processor.grab_frame()
+        # 下一个采样帧是15，之前最近的关键帧是10
+        processor._seek_to_keyframe()
+        assert processor.current_frame_index == 10
+
+        frame_index, _ = processor.grab_frame()
+        assert frame_index == 10
+        assert frame_number(processor.retrieve_frame()) == 10
+
+    def test_no_seek_when_keyframe_is_behind(self, processor):
+        for _ in range(12):
+            processor.grab_frame()
+        # 采样帧15之前最近的关键帧10已经读过，继续逐帧grab()
+        processor._seek_to_keyframe()
+        assert processor.current_frame_index == 12
+
+    def test_no_seek_on_sample_frame(self, processor):
+        for _ in range(30):
+            processor.grab_frame()
+        processor._seek_to_keyframe()
+        assert processor.current_frame_index == 30
+        processor.grab_frame()
+        assert frame_number(processor.retrieve_frame()) == 30
+
+    def test_failed_seek_disables_keyframes(self, processor, monkeypatch):
+        monkeypatch.setattr(processor.video_capture, 'set', lambda prop_id, value: False)
+        processor.grab_frame()
+        processor._seek_to_keyframe()
+        assert processor.keyframes is None
+        assert processor.current_frame_index == 1
+
+
+class FakeDetector:
+    """代替人脸检测器：每批的第一帧返回一个匹配，记录处理期间使用的缓冲区池"""
+    device = 'cpu'
+
+    def __init__(self, fail_on_call=None):
+        self.processor = None
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+        self.pools = []
+        self.frame_pool = None
+        self.batch_sizes = []
+
+    def match_faces_batch(self, images, ctx=None, preprocess=False, rgb=False):
+        self.calls += 1
+        self.batch_sizes.append(len(images))
+        if not self.pools:
+            self.frame_pool = self.processor.frame_pool
+            self.pools = [pool for pool in (self.processor.resize_pool, self.frame_pool) if pool is not None]
+        if self.calls == self.fail_on_call:
+            raise RuntimeError('检测失败')
+        return [[{'location': (2, 10, 10, 2)}] if i == 0 else [] for i in range(len(images))]
+
+    def draw_face_rectangles_inplace(self, image, face_locations, color=(0, 255, 0), thickness=2):
+        return image
+
+
+@pytest.fixture(params=[True, False], ids=['grab', 'read'])
+def grab_skip(request, monkeypatch):
+    monkeypatch.setattr(video_processor, 'FRAME_GRAB_SKIP', request.param)
+
+
+class TestBufferRelease:
+    """处理结束后，所有从缓冲区池取出的数组都应已放回"""
+
+    def run(self, video_path, detector, callback=None):
+        processor = VideoProcessor(detector, detection_frequency=2, max_workers=2, batch_size=3,
+                                   backend='opencv', prefetch=1)
+        detector.processor = processor
+        processor.min_time_interval = 0.2
+        assert processor.load_video(video_path)
+        processor.process_video(callback)
+        processor.close_video()
+
+        # OpenCV后端的原始帧也来自缓冲区池
+        assert processor.frame_pool is None and detector.frame_pool in detector.pools
+        assert [pool.outstanding for pool in detector.pools] == [0] * len(detector.pools)
+        return processor
+
+    def test_complete_run(self, video_path, grab_skip):
+        detector = FakeDetector()
+        processor = self.run(video_path, detector)
+        assert processor.processed_frames == 20
+        assert processor.get_result_count() > 0
+
+    def test_stopped_by_callback(self, video_path, grab_skip):
+        detector = FakeDetector()
+
+        def callback(frame_index, frame_count, progress, frame):
+            # 等解码线程填满流水线后再停止，使各阶段都留有未处理的批次
+            deadline = time.monotonic() + 5
+            while detector.processor.processed_frames < 15 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return False
+
+        processor = self.run(video_path, detector, callback)
+        assert 15 <= processor.processed_frames < 20
+
+    def test_detector_exception(self, video_path, grab_skip):
+        self.run(video_path, FakeDetector(fail_on_call=2))
+
+    def test_callback_exception(self, video_path, grab_skip):
+        def callback(frame_index, frame_count, progress, frame):
+            if frame_index == 8:
+                raise RuntimeError('回调失败')
+            return True
+
+        self.run(video_path, FakeDetector(), callback)
+
+
+class TestFullRead:
+    """关闭FRAME_GRAB_SKIP时逐帧完整读取，但只转换需要检测的帧"""
+
+    @pytest.fixture
+    def processor(self, video_path, monkeypatch):
+        monkeypatch.setattr(video_processor, 'FRAME_GRAB_SKIP', False)
+        processor = VideoProcessor(FakeDetector(), detection_frequency=5, backend='opencv')
+        assert processor.load_video(video_path)
+        yield processor
+        processor.close_video()
+
+    def test_retrieves_decoded_frame(self, processor):
+        for expected in range(3):
+            frame_index, _ = processor.grab_frame(decode=True)
+            assert frame_index == expected
+        assert frame_number(processor.retrieve_frame(rgb=True)) == 2
+
+    def test_converts_only_sampled_frames(self, processor, monkeypatch):
+        conversions = []
+        cvt_color = cv2.cvtColor
+
+        def counting_cvt_color(src, code, *args, **kwargs):
+            # 只统计解码得到的BGR帧（保存截图时的RGB转BGR使用相同的转换代码）
+            if src is processor._bgr_scratch:
+                conversions.append(code)
+            return cvt_color(src, code, *args, **kwargs)
+
+        processor.face_detector.processor = processor
+        monkeypatch.setattr(cv2, 'cvtColor', counting_cvt_color)
+        processor.process_video()
+
+        assert processor.current_frame_index == 40
+        assert processor.processed_frames == 8
+        assert len(conversions) == 8
+
+
+def test_detect_batch_skips_frames_inside_min_interval():
+    detector = FakeDetector()
+    processor = VideoProcessor(detector, detection_frequency=2)
+    detector.processor = processor
+    frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(3)]
+    batch = [(frame, frame, frame_index, frame_index / 25) for frame, frame_index in zip(frames, (2, 4, 6))]
+
+    # 批次提交后写入线程记录了新的匹配，帧4之前的帧不再检测
+    processor.skip_until_frame = 4
+    results = processor.detect_batch(batch)
+
+    assert detector.batch_sizes == [2]
+    assert [result['frame_index'] for result in results] == [2, 4, 6]
+    assert [result['has_matches'] for result in results] == [False, True, False]
+    assert all(result['frame'] is frame for result, frame in zip(results, frames))
+
+    # 整批都在最小时间间隔内时不调用检测器
+    processor.skip_until_frame = 10
+    assert len(processor.detect_batch(batch)) == 3
+    assert detector.batch_sizes == [2]